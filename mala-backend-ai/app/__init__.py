@@ -1,8 +1,15 @@
 from flask import Flask
 from flask_cors import CORS
 
+from .archive import init_archiver
+from .blob_store import init_blob_store
+from .catalog import init_catalog
 from .config import Config
 from .database import init_db
+from .detection_log import init_detection_log
+from .idempotency import init_idempotency
+from .image_variants import init_image_variants
+from .slip_index import init_slip_index
 from .utils import init_upload_dirs, init_ai_model
 
 
@@ -12,6 +19,9 @@ def create_app(config_class: type[Config] = Config) -> Flask:
 
     # Ensure upload directories exist and normalize paths
     init_upload_dirs(app)
+    init_blob_store(app)
+    init_slip_index(app)
+    init_image_variants(app)
 
     CORS(
         app,
@@ -26,16 +36,24 @@ def create_app(config_class: type[Config] = Config) -> Flask:
         },
         supports_credentials=True,
         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        allow_headers=["Content-Type", "Authorization"],
-        expose_headers=["Content-Type", "Authorization"],
+        allow_headers=["Content-Type", "Authorization", "Idempotency-Key"],
+        expose_headers=["Content-Type", "Authorization", "Idempotent-Replayed"],
     )
 
+    init_catalog(app)
     init_db(app)
     init_ai_model(app)
+    init_detection_log(app)
+    init_idempotency(app)
+    init_archiver(app)
 
     from .routes import register_routes
 
     register_routes(app)
+
+    from .commands import register_commands
+
+    register_commands(app)
     return app
 
 
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.dialects.mysql import DATETIME
+
+from app.database import db
+from app.models import (
+    Order,
+    OrderArchive,
+    OrderItem,
+    OrderItemArchive,
+    Payment,
+    PaymentArchive,
+    TransferSlip,
+    TransferSlipArchive,
+)
+
+
+archive_cli = AppGroup("archive", help="Move old orders to the archive tables.")
+
+# Parent first for the copy; children first for the delete.
+_TABLES = (
+    (Order, OrderArchive),
+    (OrderItem, OrderItemArchive),
+    (Payment, PaymentArchive),
+    (TransferSlip, TransferSlipArchive),
+)
+
+
+def archive_cutoff(now: datetime | None = None) -> datetime | None:
+    days = int(current_app.config.get("ARCHIVE_AFTER_DAYS", 0))
+    if days <= 0:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=days)
+
+
+def includes_archive(start: datetime | None, end: datetime | None = None) -> bool:
+    """Whether a read of ``[start, end)`` can overlap archived orders.
+
+    Reads without a range stay on the hot tables; a range with either bound
+    adds the archive when that bound reaches into archived dates.
+    """
+    if start is None and end is None:
+        return False
+    oldest, newest = db.session.query(
+        func.min(OrderArchive.created_at), func.max(OrderArchive.created_at)
+    ).one()
+    if newest is None:
+        return False
+    if start is not None and start > newest:
+        return False
+    if end is not None and end <= oldest:
+        return False
+    return True
+
+
+def _order_key(model):
+    return model.id if model is Order else model.order_id
+
+
+def archive_batch(cutoff: datetime, batch: int) -> int:
+    """Move up to ``batch`` orders created before ``cutoff`` (with their rows).
+
+    Copies with INSERT ... SELECT and deletes from the hot tables in the
+    caller's transaction. Locked rows are skipped so concurrent movers in
+    other workers take different orders.
+    """
+    ids = [
+        row[0]
+        for row in db.session.query(Order.id)
+        .filter(Order.created_at < cutoff)
+        .order_by(Order.created_at.asc(), Order.id.asc())
+        .limit(batch)
+        .with_for_update(skip_locked=True)
+        .all()
+    ]
+    if not ids:
+        return 0
+
+    archived_at = datetime.utcnow()
+    for hot, cold in _TABLES:
+        names = [column.name for column in hot.__table__.columns]
+        columns = [hot.__table__.c[name] for name in names]
+        if cold is OrderArchive:
+            names.append("archived_at")
+            columns.append(literal(archived_at, DATETIME))
+        source = select(*columns).where(_order_key(hot).in_(ids))
+        db.session.execute(insert(cold.__table__).from_select(names, source))
+
+    for hot, _ in reversed(_TABLES):
+        hot.query.filter(_order_key(hot).in_(ids)).delete(synchronize_session=False)
+    return len(ids)
+
+
+def archive_orders(cutoff: datetime, batch: int) -> int:
+    moved = 0
+    while True:
+        count = archive_batch(cutoff, batch)
+        db.session.commit()
+        moved += count
+        if count < batch:
+            return moved
+
+
+class Archiver:
+    """Daemon thread that archives old orders every ``interval`` seconds."""
+
+    def __init__(self, app, interval: float):
+        self.app = app
+        self.interval = interval
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self) -> None:
+        # Threads don't survive a fork, so start one per worker on first request.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="order-archiver", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self.app.app_context():
+                try:
+                    cutoff = archive_cutoff()
+                    if cutoff is not None:
+                        moved = archive_orders(cutoff, int(self.app.config.get("ARCHIVE_BATCH", 500)))
+                        if moved:
+                            self.app.logger.info("Archived %d orders older than %s", moved, cutoff)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Order archiving failed")
+                finally:
+                    db.session.remove()
+
+
+def init_archiver(app) -> None:
+    interval = float(app.config.get("ARCHIVE_INTERVAL", 0))
+    if interval <= 0 or int(app.config.get("ARCHIVE_AFTER_DAYS", 0)) <= 0:
+        app.extensions["archiver"] = None
+        return
+    archiver = Archiver(app, interval)
+    app.extensions["archiver"] = archiver
+    app.before_request(archiver.ensure_running)
+
+
+@archive_cli.command("run")
+@click.option("--before", default=None, help="Archive orders created before this date (YYYY-MM-DD).")
+@click.option("--batch", default=None, type=int, help="Orders moved per transaction.")
+def run_archive(before: str | None, batch: int | None) -> None:
+    """Move orders older than ARCHIVE_AFTER_DAYS (or --before) to the archive."""
+    cutoff = datetime.fromisoformat(before) if before else archive_cutoff()
+    if cutoff is None:
+        raise click.ClickException("Archiving is disabled (MALA_ARCHIVE_AFTER_DAYS=0); pass --before")
+    batch = batch or int(current_app.config.get("ARCHIVE_BATCH", 500))
+    moved = archive_orders(cutoff, batch)
+    click.echo(f"Archived {moved} orders created before {cutoff:%Y-%m-%d %H:%M}")
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from itertools import islice
+from pathlib import Path
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import or_
+
+from app.blob_store import SLIPS, blob_store, register_blob
+from app.database import db
+from app.detection_log import link_detections
+from app.models import Order, OrderItem, Payment, TransferSlip, TransferSlipArchive, UploadRef
+from app.order_items import write_order_items
+from app.slip_index import slip_index
+from app.utils import get_file_type, referenced_slip
+
+
+data_cli = AppGroup("data", help="One-off data migrations and backfills.")
+
+# Keys that used to live in Payment.ref and now have columns.
+_MIGRATED_REF_KEYS = ("slips", "slipUrl", "slipId", "qrImageUrl")
+
+
+def _migrate_payment_ref(payment: Payment, ref: dict, slips_by_name: dict) -> None:
+    if not payment.qr_image_url:
+        payment.qr_image_url = ref.get("qrImageUrl") or ref.get("slipUrl")
+
+    slip_id = ref.get("slipId")
+    if slip_id:
+        slip = TransferSlip.query.get(slip_id)
+        if slip and slip.payment_id is None:
+            slip.payment_id = payment.id
+
+    for entry in ref.get("slips") or []:
+        if not isinstance(entry, dict) or not entry.get("slipUrl"):
+            continue
+        name = entry["slipUrl"].rsplit("/", 1)[-1]
+        existing = slips_by_name.get((payment.order_id, name))
+        if existing is not None:
+            if existing.payment_id is None:
+                existing.payment_id = payment.id
+            continue
+        slip = referenced_slip(payment.order_id, payment.id, entry)
+        db.session.add(slip)
+        slips_by_name[(payment.order_id, name)] = slip
+
+
+@data_cli.command("backfill-payment-refs")
+@click.option("--batch", default=500, show_default=True, help="Payments processed per transaction.")
+def backfill_payment_refs(batch: int) -> None:
+    """Move slip/QR data out of Payment.ref JSON into slip and payment columns.
+
+    Migrated keys are stripped from ``ref`` so the command is safe to re-run.
+    """
+    last_id = 0
+    migrated = 0
+    while True:
+        payments = (
+            Payment.query.filter(Payment.id > last_id, Payment.ref.like("{%"))
+            .order_by(Payment.id.asc())
+            .limit(batch)
+            .all()
+        )
+        if not payments:
+            break
+        last_id = payments[-1].id
+
+        order_ids = {payment.order_id for payment in payments}
+        slips_by_name = {}
+        for slip in TransferSlip.query.filter(TransferSlip.order_id.in_(order_ids)).all():
+            stored_name = Path(slip.file_path).name if slip.file_path else slip.filename
+            slips_by_name[(slip.order_id, stored_name)] = slip
+
+        for payment in payments:
+            try:
+                ref = json.loads(payment.ref)
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(ref, dict) or not any(key in ref for key in _MIGRATED_REF_KEYS):
+                continue
+            _migrate_payment_ref(payment, ref, slips_by_name)
+            rest = {key: value for key, value in ref.items() if key not in _MIGRATED_REF_KEYS}
+            payment.ref = json.dumps(rest) if rest else None
+            migrated += 1
+
+        db.session.commit()
+        db.session.expunge_all()
+
+    click.echo(f"Migrated slip references for {migrated} payments")
+
+
+@data_cli.command("backfill-order-items")
+@click.option("--batch", default=500, show_default=True, help="Orders processed per transaction.")
+def backfill_order_items(batch: int) -> None:
+    """Populate order_items for orders that don't have line item rows yet."""
+    has_items = db.session.query(OrderItem.id).filter(OrderItem.order_id == Order.id).exists()
+    last_id = 0
+    orders_done = 0
+    rows_done = 0
+    while True:
+        orders = (
+            Order.query.filter(Order.id > last_id, ~has_items)
+            .order_by(Order.id.asc())
+            .limit(batch)
+            .all()
+        )
+        if not orders:
+            break
+        last_id = orders[-1].id
+        rows_done += write_order_items(orders)
+        orders_done += len(orders)
+        db.session.commit()
+        db.session.expunge_all()
+
+    click.echo(f"Wrote {rows_done} line items for {orders_done} orders")
+
+
+@data_cli.command("link-detections")
+def link_detections_command() -> None:
+    """Fill detections.order_id for every order that carries a detection_hash."""
+    linked = link_detections(None)
+    db.session.commit()
+    click.echo(f"Linked {linked} detections to orders")
+
+
+def _flat_slip_rows(folder: Path, names: list[str]) -> dict[str, list]:
+    """Hot and archived transfer_slips rows still pointing at flat files in ``names``.
+
+    Matched on the stored path or name, not the order id in the file name:
+    POS slips are uploaded under a placeholder order id and moved to the real
+    order by ``add_payment``.
+    """
+    wanted = set(names)
+    rows: dict[str, list] = {}
+    if not wanted:
+        return rows
+    paths = [str(folder / name) for name in names]
+    store = blob_store()
+    for model in (TransferSlip, TransferSlipArchive):
+        candidates = model.query.filter(or_(model.file_path.in_(paths), model.filename.in_(names))).all()
+        for slip in candidates:
+            if not slip.file_path or store.owns(slip.file_path):
+                continue
+            name = Path(slip.file_path).name
+            if name in wanted:
+                rows.setdefault(name, []).append(slip)
+    return rows
+
+
+@data_cli.command("migrate-slips")
+@click.option("--batch", default=500, show_default=True, help="Files moved per transaction.")
+@click.option("--pause", default=0.0, show_default=True, help="Seconds to sleep between batches.")
+def migrate_slips(batch: int, pause: float) -> None:
+    """Move flat files in UPLOAD_FOLDER into the sharded blob store.
+
+    Each batch links the files into ``uploads/blobs``, adds their
+    ``upload_refs`` and repoints matching ``transfer_slips`` rows (hot and
+    archived), commits, and only then removes the flat copies, so every slip
+    stays servable throughout. Safe to stop and re-run; use ``--pause`` to
+    go easy on the disk of a live server.
+    """
+    store = blob_store()
+    folder = Path(current_app.config["UPLOAD_FOLDER"])
+    moved = 0
+    skipped = 0
+    with os.scandir(folder) as entries:
+        files = (entry.name for entry in entries if entry.is_file() and not entry.name.startswith("."))
+        while True:
+            names = list(islice(files, batch))
+            if not names:
+                break
+            rows = _flat_slip_rows(folder, names)
+            known = dict(
+                db.session.query(UploadRef.name, UploadRef.blob_sha256).filter(
+                    UploadRef.kind == SLIPS, UploadRef.name.in_(names)
+                )
+            )
+
+            done = []
+            for name in names:
+                slips = rows.get(name, [])
+                if any(slip.filename != name for slip in slips):
+                    # URLs of blob-backed slips are built from ``filename``.
+                    click.echo(f"skip {name}: row filename differs from the stored name")
+                    skipped += 1
+                    continue
+                sha256, size, staged = store.stage(folder / name)
+                if name not in known:
+                    _, target, _ = register_blob(SLIPS, name, sha256, size, get_file_type(name), staged)
+                elif known[name] != sha256:
+                    staged.unlink(missing_ok=True)
+                    click.echo(f"skip {name}: already stored with different contents")
+                    skipped += 1
+                    continue
+                else:
+                    target = store.place(staged, sha256)
+                for slip in slips:
+                    slip.file_path = str(target)
+                done.append(name)
+
+            db.session.commit()
+            db.session.expunge_all()
+            # A flat file goes only once no row points at it any more.
+            still_used = _flat_slip_rows(folder, done)
+            for name in done:
+                if name in still_used:
+                    click.echo(f"keep {name}: still referenced by a transfer_slips row")
+                    skipped += 1
+                    continue
+                (folder / name).unlink(missing_ok=True)
+                slip_index().discard(name)
+                moved += 1
+            click.echo(f"moved {moved} slips")
+            if pause:
+                time.sleep(pause)
+
+    click.echo(f"Moved {moved} slips into {store.root} ({skipped} left in place)")
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app.database import db
+from app.file_serving import upload_path
+from app.models import UploadBlob, UploadRef
+from app.utils import get_file_type
+
+
+# ``upload_refs.kind`` values; names are unique per kind.
+PRODUCT_IMAGES = "product"
+QR_IMAGES = "qr"
+SLIPS = "slip"
+
+_CHUNK = 1024 * 1024
+
+
+class BlobStore:
+    """Upload bytes stored once under ``root/ab/cd/<sha256>``.
+
+    Also remembers ref -> blob lookups for this worker; a ref never points at
+    different bytes, so entries only leave the cache by age or ``forget``.
+    """
+
+    def __init__(self, root: Path, cache_size: int = 4096):
+        self.root = Path(root)
+        self.cache_size = cache_size
+        self._refs: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def owns(self, file_path: str | None) -> bool:
+        return bool(file_path) and Path(file_path).parent.parent.parent == self.root
+
+    def write(self, stream) -> tuple[str, int, Path]:
+        """Copy ``stream`` to a temp file in the store, hashing it on the way.
+
+        Returns ``(sha256, size, staged)``. The staged copy becomes the blob
+        (or is dropped as a duplicate) in ``place``, once the blob row is
+        locked, so it can't race a concurrent delete of the same bytes.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(prefix=".upload-", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for chunk in iter(lambda: stream.read(_CHUNK), b""):
+                    digest.update(chunk)
+                    handle.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return digest.hexdigest(), size, Path(tmp)
+
+    def stage(self, source: Path) -> tuple[str, int, Path]:
+        """Like ``write`` for a file already on disk: hard-linked when possible; ``source`` stays put."""
+        digest = hashlib.sha256()
+        size = 0
+        with open(source, "rb") as handle:
+            for chunk in iter(lambda: handle.read(_CHUNK), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        staged = self.root / f".upload-{uuid.uuid4().hex}"
+        try:
+            os.link(source, staged)
+        except OSError:
+            with open(source, "rb") as handle:
+                return self.write(handle)
+        return digest.hexdigest(), size, staged
+
+    def place(self, staged: Path, sha256: str) -> Path:
+        """Move ``staged`` to the blob path, or drop it when the blob is already there."""
+        target = self.path_for(sha256)
+        if target.is_file():
+            staged.unlink(missing_ok=True)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged, target)
+        return target
+
+    def cached(self, kind: str, name: str) -> str | None:
+        with self._lock:
+            sha256 = self._refs.get((kind, name))
+            if sha256 is not None:
+                self._refs.move_to_end((kind, name))
+            return sha256
+
+    def remember(self, kind: str, name: str, sha256: str) -> None:
+        with self._lock:
+            self._refs[(kind, name)] = sha256
+            if len(self._refs) > self.cache_size:
+                self._refs.popitem(last=False)
+
+    def forget(self, kind: str, name: str) -> None:
+        with self._lock:
+            self._refs.pop((kind, name), None)
+
+
+def init_blob_store(app) -> None:
+    root = Path(app.config.get("BLOB_DIR") or Path(app.config["UPLOAD_FOLDER"]).parent / "blobs")
+    root.mkdir(parents=True, exist_ok=True)
+    app.config["BLOB_DIR"] = root
+    app.extensions["blob_store"] = BlobStore(root)
+
+
+def blob_store() -> BlobStore:
+    return current_app.extensions["blob_store"]
+
+
+def _unique_name(name: str) -> str:
+    stem, dot, ext = name.rpartition(".")
+    suffix = uuid.uuid4().hex[:8]
+    return f"{stem}_{suffix}.{ext}" if dot else f"{name}_{suffix}"
+
+
+def store_upload(kind: str, file, name: str, reuse: bool = False) -> tuple[str, Path, bool]:
+    """Store an uploaded ``FileStorage`` by content hash and add a ``kind``/``name`` ref to it.
+
+    Returns ``(name, path, duplicate)``; ``duplicate`` means the bytes were
+    already stored. With ``reuse`` an existing ref of the same kind to those
+    bytes is returned instead of adding ``name``, so re-uploading a menu photo
+    gives back its original URL. ``name`` gets a random suffix if it is
+    already taken. Rows are added to the session; the caller commits.
+    """
+    sha256, size, staged = blob_store().write(file.stream)
+    return register_blob(kind, name, sha256, size, get_file_type(file.filename or name), staged, reuse)
+
+
+def _lock_blob(sha256: str) -> UploadBlob | None:
+    # A locking read also sees rows committed after this transaction began.
+    return db.session.query(UploadBlob).filter(UploadBlob.sha256 == sha256).with_for_update().first()
+
+
+def _name_taken(kind: str, name: str) -> bool:
+    return db.session.query(UploadRef.id).filter(UploadRef.kind == kind, UploadRef.name == name).first() is not None
+
+
+def register_blob(
+    kind: str, name: str, sha256: str, size: int, mime_type: str, staged: Path, reuse: bool = False
+) -> tuple[str, Path, bool]:
+    """Record the blob for a ``staged`` file and add a ref to it; see ``store_upload``.
+
+    The blob row stays locked until the caller commits, so ``release_upload``
+    can't delete it (or its file) in between.
+    """
+    store = blob_store()
+    try:
+        duplicate = _lock_blob(sha256) is not None
+        if not duplicate:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(UploadBlob(sha256=sha256, size=size, mime_type=mime_type))
+            except IntegrityError:
+                # The same bytes were committed by a concurrent upload.
+                if _lock_blob(sha256) is None:
+                    raise
+                duplicate = True
+        path = store.place(staged, sha256)
+    except BaseException:
+        staged.unlink(missing_ok=True)
+        raise
+
+    if duplicate and reuse:
+        existing = (
+            db.session.query(UploadRef.name)
+            .filter(UploadRef.kind == kind, UploadRef.blob_sha256 == sha256)
+            .order_by(UploadRef.id.asc())
+            .first()
+        )
+        if existing is not None:
+            return existing.name, path, True
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(UploadRef(kind=kind, name=name, blob_sha256=sha256))
+    except IntegrityError:
+        if not _name_taken(kind, name):
+            raise
+        name = _unique_name(name)
+        with db.session.begin_nested():
+            db.session.add(UploadRef(kind=kind, name=name, blob_sha256=sha256))
+    return name, path, duplicate
+
+
+def resolve_upload(kind: str, directory, filename: str) -> Path | None:
+    """Path behind an upload URL: a file in the legacy ``directory``, else the ref's blob."""
+    legacy = upload_path(directory, filename)
+    if legacy is not None:
+        return legacy
+
+    store = blob_store()
+    sha256 = store.cached(kind, filename)
+    if sha256 is None:
+        sha256 = (
+            db.session.query(UploadRef.blob_sha256)
+            .filter(UploadRef.kind == kind, UploadRef.name == filename)
+            .scalar()
+        )
+        if sha256 is None:
+            return None
+        store.remember(kind, filename, sha256)
+    path = store.path_for(sha256)
+    return path if path.is_file() else None
+
+
+def release_upload(kind: str, name: str) -> str | None:
+    """Drop the ``kind``/``name`` ref and, if nothing else uses its blob, the blob row.
+
+    Returns the sha256 to pass to ``discard_blob`` once the caller has
+    committed, or ``None`` when the blob is still in use.
+    """
+    ref = UploadRef.query.filter_by(kind=kind, name=name).first()
+    if ref is None:
+        return None
+    sha256 = ref.blob_sha256
+    # Lock first: an upload reusing these bytes holds the same lock until it commits.
+    blob = _lock_blob(sha256)
+    db.session.delete(ref)
+    blob_store().forget(kind, name)
+    db.session.flush()
+    still_used = (
+        db.session.query(UploadRef.id).filter(UploadRef.blob_sha256 == sha256).with_for_update().first()
+    )
+    if still_used is not None:
+        return None
+    if blob is not None:
+        db.session.delete(blob)
+    return sha256
+
+
+def discard_blob(sha256: str) -> None:
+    """Delete a released blob's file unless the bytes were stored again meanwhile.
+
+    Runs (and commits) its own short transaction; the locking read keeps a
+    concurrent upload of the same bytes from registering until the file is gone,
+    after which that upload puts its own copy back.
+    """
+    if _lock_blob(sha256) is None:
+        blob_store().path_for(sha256).unlink(missing_ok=True)
+    db.session.commit()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Mapping, NamedTuple
+
+from flask import current_app, request
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+
+PRODUCTS = "products"
+COLOR_PRICES = "color_prices"
+
+
+class CatalogEntry(NamedTuple):
+    version: int
+    data: Any
+    body: bytes
+    etag: str
+
+
+def init_catalog(app) -> None:
+    """Attach the per-process catalog cache to the app."""
+    app.extensions["catalog"] = {
+        "lock": Lock(),
+        "versions": {},
+        "versions_checked_at": 0.0,
+        "entries": OrderedDict(),
+    }
+
+
+def _state() -> dict:
+    return current_app.extensions["catalog"]
+
+
+def _versions() -> dict[str, int]:
+    """Read the ``catalog_versions`` row set, at most every ``CATALOG_VERSION_CHECK`` seconds.
+
+    The rows are bumped by whichever worker changes the catalog, so this is
+    how other workers learn their cached payloads are stale.
+    """
+    from app.database import db
+    from app.models import CatalogVersion
+
+    state = _state()
+    interval = float(current_app.config.get("CATALOG_VERSION_CHECK", 1.0))
+    with state["lock"]:
+        if time.monotonic() - state["versions_checked_at"] < interval:
+            return state["versions"]
+
+    versions = dict(db.session.query(CatalogVersion.name, CatalogVersion.version).all())
+    with state["lock"]:
+        state["versions"] = versions
+        state["versions_checked_at"] = time.monotonic()
+    return versions
+
+
+def cached_entry(name: str, variant: str, loader: Callable[[], Any]) -> CatalogEntry:
+    """Return the cached payload for ``(name, variant)``, rebuilding it when the version moved."""
+    version = int(_versions().get(name, 0))
+    state = _state()
+    with state["lock"]:
+        entry = state["entries"].get((name, variant))
+        if entry is not None and entry.version == version:
+            state["entries"].move_to_end((name, variant))
+            return entry
+
+    data = loader()
+    body = current_app.json.response(data).get_data()
+    entry = CatalogEntry(version, data, body, hashlib.sha256(body).hexdigest()[:32])
+    limit = int(current_app.config.get("CATALOG_CACHE_ENTRIES", 16))
+    with state["lock"]:
+        entries = state["entries"]
+        entries[(name, variant)] = entry
+        entries.move_to_end((name, variant))
+        # Variants come from request headers (the host), so keep only the
+        # most recently used ones per section.
+        variants = [key for key in entries if key[0] == name]
+        for key in variants[: max(0, len(variants) - limit)]:
+            del entries[key]
+    return entry
+
+
+def bump_catalog_version(*names: str) -> None:
+    """Mark catalog sections as changed inside the caller's transaction."""
+    from app.database import db
+    from app.models import CatalogVersion
+
+    if names:
+        # One upsert, so two first writes of a section can't both INSERT it.
+        table = CatalogVersion.__table__
+        stmt = mysql_insert(table).values([{"name": name, "version": 1} for name in sorted(set(names))])
+        db.session.execute(stmt.on_duplicate_key_update(version=table.c.version + 1))
+
+    state = _state()
+    with state["lock"]:
+        for key in [key for key in state["entries"] if key[0] in names]:
+            del state["entries"][key]
+        state["versions_checked_at"] = 0.0
+
+
+def catalog_response(entry: CatalogEntry):
+    """JSON response for ``entry`` with an ETag; 304 when the client already has it."""
+    response = current_app.response_class(entry.body, mimetype="application/json")
+    response.set_etag(entry.etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def _load_products() -> list[dict]:
+    from app.models import Product
+    from app.utils import serialize_product
+
+    return [serialize_product(p) for p in Product.query.order_by(Product.id.desc()).all()]
+
+
+def _load_color_prices() -> dict[str, dict]:
+    from app.models import ColorPrice
+
+    return {
+        row.color: {
+            "price": float(row.price),
+            "stock": int(row.stock or 0),
+        }
+        for row in ColorPrice.query.order_by(ColorPrice.color.asc()).all()
+    }
+
+
+def products_entry() -> CatalogEntry:
+    # Image URLs are absolute, so each host gets its own copy (LRU-capped).
+    return cached_entry(PRODUCTS, request.url_root, _load_products)
+
+
+def color_prices_entry() -> CatalogEntry:
+    return cached_entry(COLOR_PRICES, "", _load_color_prices)
+
+
+def get_color_prices() -> dict[str, dict]:
+    """Return ``{color: {"price", "stock"}}`` from the cache (treat as read-only)."""
+    return color_prices_entry().data
+
+
+def price_counts(counts: Mapping[str, int]) -> dict:
+    """Turn detected ``counts`` into POS line items using cached colour prices."""
+    prices = get_color_prices()
+    items: list[dict] = []
+    missing: list[str] = []
+    subtotal = 0.0
+
+    for color, qty in counts.items():
+        qty = int(qty or 0)
+        if qty <= 0:
+            continue
+        entry = prices.get(color) or prices.get(str(color).lower())
+        price = float(entry["price"]) if entry else 0.0
+        if price <= 0:
+            missing.append(color)
+            continue
+        amount = round(price * qty, 2)
+        subtotal += amount
+        items.append(
+            {
+                "id": f"color-{color}",
+                "name": color,
+                "color": color,
+                "price": price,
+                "qty": qty,
+                "amount": amount,
+            }
+        )
+
+    return {"items": items, "subtotal": round(subtotal, 2), "missing": missing}
@@ -0,0 +1,16 @@
+from flask import Flask
+
+
+def register_commands(app: Flask) -> None:
+    """Attach maintenance command groups to ``flask``."""
+    from .archive import archive_cli
+    from .backfills import data_cli
+    from .idempotency import idempotency_cli
+    from .query_plans import queries_cli
+    from .reports import reports_cli
+
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(queries_cli)
+    app.cli.add_command(reports_cli)
@@ -16,6 +16,11 @@ def _resolve_ssl_path(value):
     return str((BASE_DIR / candidate).resolve())
 
 
+def _parse_scales(value):
+    """Parse a comma separated list of ROI scale factors."""
+    return [float(x.strip()) for x in value.split(",") if x.strip()]
+
+
 class Config:
     # Database
     SQLALCHEMY_DATABASE_URI = os.getenv(
@@ -60,7 +65,30 @@ class Config:
     UPLOAD_FOLDER = BASE_DIR / "uploads" / "slips"
     PRODUCTS_UPLOAD_DIR = BASE_DIR / "uploads" / "products"
     QR_UPLOAD_DIR = BASE_DIR / "uploads" / "qr_codes"
+    # Content-addressed upload bytes (ab/cd/<sha256>); the directories above hold older files
+    BLOB_DIR = BASE_DIR / "uploads" / "blobs"
     
+    # Uploaded files never change under a URL, so browsers may cache them for good
+    UPLOAD_CACHE_MAX_AGE = int(os.getenv("MALA_UPLOAD_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+    # Hand file bodies to the front proxy: "" (Flask sends), "x-accel" (nginx), "x-sendfile" (Apache/lighttpd)
+    FILE_OFFLOAD = os.getenv("MALA_FILE_OFFLOAD", "").lower()
+    USE_X_SENDFILE = FILE_OFFLOAD == "x-sendfile"
+    # X-Accel-Redirect = X_ACCEL_PREFIX + path relative to X_ACCEL_ROOT (an nginx `internal` location)
+    X_ACCEL_ROOT = Path(os.getenv("MALA_X_ACCEL_ROOT", str(BASE_DIR / "uploads")))
+    X_ACCEL_PREFIX = os.getenv("MALA_X_ACCEL_PREFIX", "/_uploads")
+
+    # Resized product image derivatives (needs Pillow); empty widths disables
+    IMAGE_VARIANT_WIDTHS = tuple(
+        int(w) for w in os.getenv("MALA_IMAGE_VARIANT_WIDTHS", "160,320,640,1280").split(",") if w.strip()
+    )
+    IMAGE_VARIANT_DIR = BASE_DIR / "uploads" / "variants"
+    IMAGE_VARIANT_CACHE_MB = float(os.getenv("MALA_IMAGE_VARIANT_CACHE_MB", "512"))
+    IMAGE_VARIANT_QUALITY = int(os.getenv("MALA_IMAGE_VARIANT_QUALITY", "80"))
+    IMAGE_VARIANT_EAGER = os.getenv("MALA_IMAGE_VARIANT_EAGER", "1") == "1"
+
+    # Seconds before the in-memory slip file index is rescanned
+    SLIP_INDEX_TTL = float(os.getenv("MALA_SLIP_INDEX_TTL", "300"))
+
     # File types
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'heic', 'heif'}
     
@@ -80,13 +108,86 @@ class Config:
     # ROI Settings
     RESPECT_USER_ROI = os.getenv("MALA_RESPECT_USER_ROI", "1") == "1"
     USER_PAD = float(os.getenv("MALA_USER_PAD", "0.10"))
-    ROI_SCALES = [float(x.strip()) for x in os.getenv(
-        "MALA_ROI_SCALES", "0.90,1.00,1.15,1.30,1.45"
-    ).split(",")]
+    ROI_SCALES = _parse_scales(os.getenv("MALA_ROI_SCALES", "0.90,1.00,1.15,1.30,1.45"))
     EDGE_MARGIN = float(os.getenv("MALA_EDGE_MARGIN", "0.08"))
     DENSITY_MIN = float(os.getenv("MALA_DENSITY_MIN", "0.06"))
     DENSITY_MAX = float(os.getenv("MALA_DENSITY_MAX", "0.22"))
+
+    # Detection profiles (selected per request with `profile=`)
+    # "balanced" mirrors the process-wide settings above.
+    DETECT_PROFILE = os.getenv("MALA_DETECT_PROFILE", "balanced")
+    DETECT_PROFILES = {
+        "fast": {
+            "img": int(os.getenv("MALA_FAST_IMG", "640")),
+            "roi_scales": _parse_scales(os.getenv("MALA_FAST_ROI_SCALES", "1.00,1.30")),
+            "conf": float(os.getenv("MALA_FAST_CONF", str(CONF))),
+            "iou": float(os.getenv("MALA_FAST_IOU", str(IOU))),
+            "refine": False,
+            "color_override": False,
+        },
+        "balanced": {
+            "img": IMG_SIZE,
+            "roi_scales": ROI_SCALES,
+            "conf": CONF,
+            "iou": IOU,
+            "refine": True,
+            "color_override": True,
+        },
+        "accurate": {
+            "img": int(os.getenv("MALA_ACCURATE_IMG", str(max(IMG_SIZE, 1280)))),
+            "roi_scales": _parse_scales(
+                os.getenv("MALA_ACCURATE_ROI_SCALES", "0.85,0.90,1.00,1.15,1.30,1.45,1.60")
+            ),
+            "conf": float(os.getenv("MALA_ACCURATE_CONF", str(CONF))),
+            "iou": float(os.getenv("MALA_ACCURATE_IOU", str(IOU))),
+            "refine": True,
+            "color_override": True,
+        },
+    }
     
+    # Product search pagination
+    PRODUCTS_PAGE_SIZE = int(os.getenv("MALA_PRODUCTS_PAGE_SIZE", "50"))
+    PRODUCTS_PAGE_MAX = int(os.getenv("MALA_PRODUCTS_PAGE_MAX", "200"))
+    PRODUCTS_IMPORT_BATCH = int(os.getenv("MALA_PRODUCTS_IMPORT_BATCH", "500"))
+    # Narrow `q=` with the ngram FULLTEXT index; needs the index built without stopwords
+    PRODUCTS_FULLTEXT = os.getenv("MALA_PRODUCTS_FULLTEXT", "1") == "1"
+
+    # Stock: orders decrement product/colour stock; optionally reject shortfalls
+    STOCK_TRACKING = os.getenv("MALA_STOCK_TRACKING", "1") == "1"
+    STOCK_REJECT_INSUFFICIENT = os.getenv("MALA_STOCK_REJECT_INSUFFICIENT", "0") == "1"
+
+    # Order listing pagination
+    ORDERS_PAGE_SIZE = int(os.getenv("MALA_ORDERS_PAGE_SIZE", "100"))
+    ORDERS_PAGE_MAX = int(os.getenv("MALA_ORDERS_PAGE_MAX", "500"))
+    ORDERS_EXPORT_CHUNK = int(os.getenv("MALA_ORDERS_EXPORT_CHUNK", "500"))
+    ORDERS_SYNC_CHUNK = int(os.getenv("MALA_ORDERS_SYNC_CHUNK", "200"))
+
+    # Hours added to UTC timestamps when bucketing sales rollups (7 = Asia/Bangkok)
+    REPORT_UTC_OFFSET = float(os.getenv("MALA_REPORT_UTC_OFFSET", "0"))
+
+    # Catalog cache: seconds between reads of the catalog_versions row set
+    CATALOG_VERSION_CHECK = float(os.getenv("MALA_CATALOG_VERSION_CHECK", "1"))
+    # Cached copies per catalog section per worker (the product list has one per request host)
+    CATALOG_CACHE_ENTRIES = int(os.getenv("MALA_CATALOG_CACHE_ENTRIES", "16"))
+
+    # Detection history (written off the request path in batches)
+    DETECTION_LOG = os.getenv("MALA_DETECTION_LOG", "1") == "1"
+    DETECTION_LOG_BATCH = int(os.getenv("MALA_DETECTION_LOG_BATCH", "50"))
+    DETECTION_LOG_INTERVAL = float(os.getenv("MALA_DETECTION_LOG_INTERVAL", "2.0"))
+    DETECTION_LOG_QUEUE = int(os.getenv("MALA_DETECTION_LOG_QUEUE", "1000"))
+
+    # Hot/cold archiving: orders older than ARCHIVE_AFTER_DAYS move to *_archive
+    # tables. ARCHIVE_INTERVAL > 0 runs the mover in a background thread.
+    ARCHIVE_AFTER_DAYS = int(os.getenv("MALA_ARCHIVE_AFTER_DAYS", "180"))
+    ARCHIVE_BATCH = int(os.getenv("MALA_ARCHIVE_BATCH", "500"))
+    ARCHIVE_INTERVAL = float(os.getenv("MALA_ARCHIVE_INTERVAL", "0"))
+
+    # Idempotency-Key replay window and how often expired keys are purged
+    IDEMPOTENCY_TTL = float(os.getenv("MALA_IDEMPOTENCY_TTL", "86400"))
+    IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("MALA_IDEMPOTENCY_PURGE_INTERVAL", "600"))
+    # Seconds before a key still marked in progress (its worker died) may be claimed by a retry
+    IDEMPOTENCY_LOCK_TIMEOUT = float(os.getenv("MALA_IDEMPOTENCY_LOCK_TIMEOUT", "120"))
+
     # Database initialization
     AUTO_CREATE_DB = os.getenv("AUTO_CREATE_DB", "0") == "1"
     SEED_ADMIN = os.getenv("SEED_ADMIN", "0") == "1"
@@ -29,7 +29,7 @@ def seed_initial_data():
     
     try:
         # Create admin user
-        if not User.query.filter(db.func.lower(User.username) == "admin").first():
+        if not User.query.filter(User.username_lower == "admin").first():
             admin = User(
                 username="admin",
                 password=make_password_hash("admin123"),
@@ -42,7 +42,7 @@ def seed_initial_data():
             print("👤 Created admin user")
         
         # Create staff user
-        if not User.query.filter(db.func.lower(User.username) == "staff").first():
+        if not User.query.filter(User.username_lower == "staff").first():
             staff = User(
                 username="staff",
                 password=make_password_hash("123456"),
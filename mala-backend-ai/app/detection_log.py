@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select
+
+
+class DetectionRecorder:
+    """Background writer that persists detection results in batches.
+
+    ``/api/detect`` only enqueues; a daemon thread drains the queue and writes
+    with one multi-row INSERT per batch, so the request path never waits on
+    MySQL. The link to an order is kept on ``orders.detection_hash``, so it
+    survives whichever worker happens to write first: new detections are
+    joined to existing orders right after their insert, and ``link_order``
+    fills detections that were written before the order.
+    """
+
+    def __init__(self, app, batch_size: int = 50, flush_interval: float = 2.0, max_queue: int = 1000):
+        self.app = app
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.1, flush_interval)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, entry: dict) -> None:
+        self._put(("insert", entry))
+
+    def link_order(self, image_hash: str, order_id: int) -> None:
+        self._put(("link", image_hash, order_id))
+
+    def _put(self, task: tuple) -> None:
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            self.app.logger.warning("Detection log queue full - dropping %s", task[0])
+
+    def _ensure_thread(self) -> None:
+        # Threads don't survive a fork, so restart the writer in each worker.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="detection-log", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            tasks = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(tasks) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    tasks.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(tasks)
+
+    def flush(self) -> None:
+        """Synchronously write whatever is still queued (used at shutdown)."""
+        tasks = []
+        while True:
+            try:
+                tasks.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if tasks:
+            self._write(tasks)
+
+    def _write(self, tasks: list[tuple]) -> None:
+        from app.database import db
+        from app.models import Detection
+
+        with self.app.app_context():
+            try:
+                pending: list[dict] = []
+                for task in tasks:
+                    if task[0] == "insert":
+                        pending.append(task[1])
+                        continue
+                    if pending:
+                        _insert_detections(pending)
+                        pending = []
+                    _, image_hash, order_id = task
+                    Detection.query.filter(
+                        Detection.image_hash == image_hash,
+                        Detection.order_id.is_(None),
+                    ).update({"order_id": order_id}, synchronize_session=False)
+                if pending:
+                    _insert_detections(pending)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Failed to write %d detection log task(s)", len(tasks))
+            finally:
+                db.session.remove()
+
+
+def link_detections(hashes) -> int:
+    """Set ``detections.order_id`` from orders carrying the same ``detection_hash``."""
+    from app.database import db
+    from app.models import Detection, Order
+
+    linked_order = (
+        select(Order.id)
+        .where(Order.detection_hash == Detection.image_hash)
+        .order_by(Order.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    has_order = select(Order.id).where(Order.detection_hash == Detection.image_hash).exists()
+    query = Detection.query.filter(Detection.order_id.is_(None), has_order)
+    if hashes is not None:
+        query = query.filter(Detection.image_hash.in_(list(hashes)))
+    return query.update({"order_id": linked_order}, synchronize_session=False)
+
+
+def _insert_detections(entries: list[dict]) -> None:
+    from app.database import db
+    from app.models import Detection
+
+    db.session.execute(insert(Detection), entries)
+    # The order may already be saved (possibly by another worker).
+    link_detections({entry["image_hash"] for entry in entries})
+
+
+def init_detection_log(app) -> None:
+    if not app.config.get("DETECTION_LOG", True):
+        app.extensions["detection_log"] = None
+        return
+    app.extensions["detection_log"] = DetectionRecorder(
+        app,
+        batch_size=int(app.config.get("DETECTION_LOG_BATCH", 50)),
+        flush_interval=float(app.config.get("DETECTION_LOG_INTERVAL", 2.0)),
+        max_queue=int(app.config.get("DETECTION_LOG_QUEUE", 1000)),
+    )
+
+
+def _recorder() -> DetectionRecorder | None:
+    return current_app.extensions.get("detection_log")
+
+
+def record_detection(
+    image_hash: str,
+    counts: dict,
+    roi: dict,
+    timings: dict,
+    profile: str | None = None,
+    store: str | None = None,
+) -> None:
+    recorder = _recorder()
+    if recorder is None:
+        return
+    ai_state = current_app.extensions.get("ai", {})
+    recorder.record(
+        {
+            "image_hash": image_hash,
+            "created_at": datetime.utcnow(),
+            "store": store,
+            "profile": profile,
+            "model_version": ai_state.get("model_version"),
+            "counts": counts,
+            "total_items": sum(counts.values()),
+            "roi": roi,
+            "timings": timings,
+        }
+    )
+
+
+def link_detection_to_order(image_hash: str, order_id: int) -> None:
+    recorder = _recorder()
+    if recorder is None or not image_hash:
+        return
+    recorder.link_order(image_hash, order_id)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from flask import current_app, request, send_file
+from werkzeug.security import safe_join
+
+from app.utils import get_file_type
+
+
+def upload_path(directory, filename: str) -> Path | None:
+    """``directory/filename`` if it names an existing regular file, else ``None``."""
+    joined = safe_join(str(directory), filename)
+    if joined is None or not os.path.isfile(joined):
+        return None
+    return Path(joined)
+
+
+@lru_cache(maxsize=4096)
+def _content_etag(path: str, mtime_ns: int, size: int) -> str:
+    # Keyed on mtime/size so a replaced file is rehashed; uploads never change
+    # in place, so each file is read once per worker.
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def _accel_location(path: Path) -> str | None:
+    root = Path(current_app.config["X_ACCEL_ROOT"]).resolve()
+    try:
+        relative = path.resolve().relative_to(root)
+    except ValueError:
+        return None
+    return f"{current_app.config['X_ACCEL_PREFIX'].rstrip('/')}/{relative.as_posix()}"
+
+
+def send_upload(path: Path, mimetype: str | None = None, private: bool = False):
+    """Send an uploaded file as an immutable, conditionally cacheable response.
+
+    Upload names are timestamped or random, so the bytes behind a URL never
+    change: responses carry a content-hash ETag and ``Cache-Control:
+    immutable`` for ``UPLOAD_CACHE_MAX_AGE`` seconds (``private`` for slips),
+    and honour ``If-None-Match`` and ``Range``. With ``FILE_OFFLOAD`` set to
+    ``x-accel`` the body is left to nginx via ``X-Accel-Redirect``;
+    ``x-sendfile`` does the same through Flask's ``USE_X_SENDFILE``.
+    """
+    info = path.stat()
+    etag = _content_etag(str(path), info.st_mtime_ns, info.st_size)
+    mimetype = mimetype or get_file_type(path.name)
+    max_age = int(current_app.config.get("UPLOAD_CACHE_MAX_AGE", 31536000))
+
+    location = _accel_location(path) if current_app.config.get("FILE_OFFLOAD") == "x-accel" else None
+    if location is not None:
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = location
+        response.set_etag(etag)
+        response.last_modified = info.st_mtime
+        response.cache_control.max_age = max_age
+        # nginx does Range itself; answer If-None-Match here so a 304 never
+        # reaches the disk.
+        response.make_conditional(request)
+    else:
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            etag=etag,
+            conditional=True,
+            last_modified=info.st_mtime,
+            max_age=max_age,
+        )
+
+    response.cache_control.immutable = True
+    if private:
+        response.cache_control.public = False
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+import click
+from flask import Flask, current_app, jsonify, request
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+
+from app.database import db
+from app.models import IdempotencyKey
+
+
+HEADER = "Idempotency-Key"
+
+idempotency_cli = AppGroup("idempotency", help="Idempotency-Key store maintenance.")
+
+
+def init_idempotency(app: Flask) -> None:
+    app.extensions["idempotency"] = {"lock": threading.Lock(), "last_purge": 0.0}
+
+
+def purge_expired(now: datetime | None = None) -> int:
+    deleted = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at <= (now or datetime.utcnow())
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _maybe_purge() -> None:
+    """Drop expired keys at most once per ``IDEMPOTENCY_PURGE_INTERVAL`` per process."""
+    state = current_app.extensions["idempotency"]
+    interval = float(current_app.config.get("IDEMPOTENCY_PURGE_INTERVAL", 600))
+    with state["lock"]:
+        if time.monotonic() - state["last_purge"] < interval:
+            return
+        state["last_purge"] = time.monotonic()
+    purge_expired()
+
+
+def _fingerprint() -> str:
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _replay(record: IdempotencyKey, fingerprint: str):
+    if record.fingerprint != fingerprint:
+        return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+    if record.status_code is None:
+        return jsonify({"error": "a request with this Idempotency-Key is still in progress"}), 409
+    response = jsonify(record.response)
+    response.status_code = record.status_code
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _take_over(record: IdempotencyKey, fingerprint: str, now: datetime) -> bool:
+    """Claim a key whose previous claimant stopped answering (e.g. a killed worker).
+
+    An in-progress claim older than ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds is
+    moved to this request; the conditional UPDATE lets only one retry win.
+    """
+    if record.fingerprint != fingerprint or record.status_code is not None:
+        return False
+    timeout = float(current_app.config.get("IDEMPOTENCY_LOCK_TIMEOUT", 120))
+    if record.created_at > now - timedelta(seconds=timeout):
+        return False
+    ttl = float(current_app.config.get("IDEMPOTENCY_TTL", 86400))
+    claimed = IdempotencyKey.query.filter(
+        IdempotencyKey.id == record.id,
+        IdempotencyKey.status_code.is_(None),
+        IdempotencyKey.created_at == record.created_at,
+    ).update({"created_at": now, "expires_at": now + timedelta(seconds=ttl)}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+def _claim(record_id: int, claimed_at: datetime):
+    # Matches only while this request still holds the claim.
+    return IdempotencyKey.query.filter(
+        IdempotencyKey.id == record_id, IdempotencyKey.created_at == claimed_at
+    )
+
+
+def _forget(record_id: int, claimed_at: datetime) -> None:
+    db.session.rollback()
+    _claim(record_id, claimed_at).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def idempotent(view):
+    """Replay the stored response when a request repeats its ``Idempotency-Key``.
+
+    The key is claimed (committed) before the view runs so a concurrent retry
+    gets 409 instead of doing the work twice; a claim left in progress for
+    ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds is taken over by the next retry.
+    Responses below 500 are stored for ``IDEMPOTENCY_TTL`` seconds; errors
+    release the key so the client can retry.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.headers.get(HEADER) or "").strip()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 128:
+            return jsonify({"error": f"{HEADER} must be at most 128 characters"}), 400
+
+        _maybe_purge()
+        fingerprint = _fingerprint()
+        # Whole seconds: the claim is matched by created_at, a DATETIME column.
+        now = datetime.utcnow().replace(microsecond=0)
+
+        record = IdempotencyKey.query.filter_by(key=key).first()
+        if record is not None and record.expires_at <= now:
+            db.session.delete(record)
+            db.session.commit()
+            record = None
+        if record is not None:
+            if not _take_over(record, fingerprint, now):
+                return _replay(record, fingerprint)
+            return _run(view, record.id, now, *args, **kwargs)
+
+        ttl = float(current_app.config.get("IDEMPOTENCY_TTL", 86400))
+        record = IdempotencyKey(
+            key=key,
+            fingerprint=fingerprint,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl),
+        )
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            record = IdempotencyKey.query.filter_by(key=key).first()
+            if record is None:
+                return jsonify({"error": "a request with this Idempotency-Key is still in progress"}), 409
+            if not _take_over(record, fingerprint, now):
+                return _replay(record, fingerprint)
+        return _run(view, record.id, now, *args, **kwargs)
+
+    return wrapper
+
+
+def _run(view, record_id: int, claimed_at: datetime, *args, **kwargs):
+    """Run ``view`` under a claimed key and store (or release) its response."""
+    try:
+        response = current_app.make_response(view(*args, **kwargs))
+    except Exception:
+        _forget(record_id, claimed_at)
+        raise
+
+    if response.status_code >= 500 or not response.is_json:
+        _forget(record_id, claimed_at)
+        return response
+
+    _claim(record_id, claimed_at).update(
+        {"status_code": response.status_code, "response": response.get_json()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return response
+
+
+@idempotency_cli.command("purge")
+def purge_command() -> None:
+    """Delete expired Idempotency-Key records (for cron)."""
+    click.echo(f"Purged {purge_expired()} expired idempotency keys")
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from flask import current_app, request
+from werkzeug.security import safe_join
+
+try:  # Pillow is optional; without it originals are served as-is.
+    from PIL import Image, ImageOps, features
+except ImportError:  # pragma: no cover - depends on the deployment
+    Image = None
+    ImageOps = None
+    features = None
+
+# What Pillow raises for uploads it can't or won't decode: truncated files
+# (EOFError), corrupt headers (SyntaxError) and oversized images.
+_RENDER_ERRORS: tuple[type[BaseException], ...] = (OSError, ValueError, EOFError, SyntaxError)
+if Image is not None:
+    _RENDER_ERRORS += (Image.DecompressionBombError,)
+
+
+_MIMETYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def variants_enabled() -> bool:
+    return Image is not None and bool(current_app.config.get("IMAGE_VARIANT_WIDTHS"))
+
+
+def _formats() -> tuple[str, ...]:
+    if features is not None and features.check("webp"):
+        return ("webp", "jpeg")
+    return ("jpeg",)
+
+
+def pick_width(requested: int) -> int:
+    """Snap ``requested`` to the smallest configured width that covers it."""
+    widths = sorted(current_app.config.get("IMAGE_VARIANT_WIDTHS", ()))
+    for width in widths:
+        if width >= requested:
+            return width
+    return widths[-1] if widths else requested
+
+
+def pick_format() -> str:
+    fmt = request.args.get("fmt")
+    formats = _formats()
+    if fmt in formats:
+        return fmt
+    return "webp" if "webp" in formats and "image/webp" in request.accept_mimetypes else "jpeg"
+
+
+def _variant_path(variant_dir: Path, filename: str, source: Path, width: int, fmt: str) -> Path | None:
+    # The source mtime is part of the name, so a replaced upload never serves
+    # an old derivative and the variant's own mtime is free to track use.
+    joined = safe_join(str(variant_dir), filename)
+    if joined is None:
+        return None
+    return Path(joined) / f"{width}-{source.stat().st_mtime_ns}.{fmt}"
+
+
+def _render(source: Path, target: Path, width: int, fmt: str, quality: int) -> int:
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            image.save(tmp, format=fmt.upper(), quality=quality, optimize=True)
+            os.replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+    return target.stat().st_size
+
+
+class VariantCache:
+    """On-disk derivative cache capped at ``max_bytes`` with LRU eviction.
+
+    Variant mtimes are bumped on every hit; when the tracked size passes the
+    cap the oldest files (other than the one just written) are removed until
+    it is back under 90%.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._bytes: int | None = None
+        self._lock = threading.Lock()
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = Path(dirpath) / name
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def touch(self, path: Path) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def added(self, size: int, keep: Path) -> None:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(entry[1] for entry in self._scan())
+            else:
+                self._bytes += size
+            if self._bytes <= self.max_bytes:
+                return
+            entries = sorted(self._scan())
+            total = sum(entry[1] for entry in entries)
+            for _, size_, path in entries:
+                if total <= self.max_bytes * 0.9:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    path.unlink()
+                    total -= size_
+                except OSError:
+                    continue
+            self._bytes = total
+
+
+def init_image_variants(app) -> None:
+    root = Path(app.config.get("IMAGE_VARIANT_DIR") or Path(app.config["PRODUCTS_UPLOAD_DIR"]).parent / "variants")
+    root.mkdir(parents=True, exist_ok=True)
+    app.config["IMAGE_VARIANT_DIR"] = root
+    max_bytes = int(float(app.config.get("IMAGE_VARIANT_CACHE_MB", 512)) * 1024 * 1024)
+    app.extensions["image_variants"] = VariantCache(root, max_bytes)
+
+
+def variant_file(source: Path, filename: str, width: int, fmt: str) -> Path | None:
+    """Path of the ``width``/``fmt`` derivative of upload ``filename`` (stored at ``source``).
+
+    Renders it on a miss. Returns ``None`` when the original should be served
+    instead (no Pillow, or an image that can't be decoded).
+    """
+    if not variants_enabled():
+        return None
+    cache: VariantCache = current_app.extensions["image_variants"]
+    target = _variant_path(cache.root, filename, source, width, fmt)
+    if target is None:
+        return None
+    if target.exists():
+        cache.touch(target)
+        return target
+    try:
+        size = _render(source, target, width, fmt, int(current_app.config.get("IMAGE_VARIANT_QUALITY", 80)))
+    except _RENDER_ERRORS as exc:
+        current_app.logger.warning("Could not render %s at %dpx: %s", filename, width, exc)
+        return None
+    cache.added(size, keep=target)
+    return target
+
+
+def variant_mimetype(fmt: str) -> str:
+    return _MIMETYPES[fmt]
+
+
+def pregenerate(source: Path, filename: str) -> None:
+    """Render every configured width/format for a fresh upload in the background."""
+    if not variants_enabled() or not current_app.config.get("IMAGE_VARIANT_EAGER", True):
+        return
+    app = current_app._get_current_object()
+    widths = list(app.config.get("IMAGE_VARIANT_WIDTHS", ()))
+
+    def run() -> None:
+        with app.app_context():
+            started = time.monotonic()
+            for width in widths:
+                for fmt in _formats():
+                    variant_file(source, filename, width, fmt)
+            app.logger.debug("Rendered variants of %s in %.2fs", filename, time.monotonic() - started)
+
+    threading.Thread(target=run, name="image-variants", daemon=True).start()
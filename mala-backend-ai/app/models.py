@@ -18,6 +18,10 @@ class User(db.Model):
 
     id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
     username = db.Column(VARCHAR(255), unique=True, nullable=False, index=True)
+    # Indexed lowercase copy so case-insensitive login doesn't scan users.
+    username_lower = db.Column(
+        VARCHAR(255), db.Computed("lower(username)", persisted=True), index=True
+    )
     password = db.Column(TEXT)
     role = db.Column(VARCHAR(100), nullable=False)
     name = db.Column(TEXT)
@@ -29,6 +33,11 @@ class User(db.Model):
 
 class Product(db.Model):
     __tablename__ = "products"
+    __table_args__ = (
+        db.Index("ix_products_category_active", "category", "active"),
+        # ngram parser so "contains" search works for Thai names too.
+        db.Index("ft_products_name", "name", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+    )
 
     id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
     name = db.Column(VARCHAR(255), nullable=False, index=True)
@@ -48,16 +57,34 @@ class ColorPrice(db.Model):
     stock = db.Column(db.Integer, nullable=False, default=0)
 
 
+class CatalogVersion(db.Model):
+    """Change counters that tell every worker to drop its cached catalog payloads."""
+
+    __tablename__ = "catalog_versions"
+
+    name = db.Column(VARCHAR(50), primary_key=True)
+    version = db.Column(BIGINT(unsigned=True), nullable=False, default=0)
+
+
 class Order(db.Model):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Serves "paid orders newest first" without a filesort.
+        db.Index("ix_orders_paid_created", "paid", "created_at"),
+    )
 
     id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
+    # Id assigned by a POS tablet for orders synced after an offline period.
+    client_id = db.Column(VARCHAR(64), unique=True)
+    # imageHash of the /api/detect call the order came from; detections.order_id
+    # is filled from this by whichever side is written last.
+    detection_hash = db.Column(VARCHAR(64), index=True)
     created_at = db.Column(DATETIME, nullable=False, default=datetime.utcnow, index=True)
     items = db.Column(JSON, nullable=False, default=list)
     persons = db.Column(db.Integer, nullable=False, default=1)
     split_mode = db.Column(VARCHAR(50), nullable=False, default="NONE")
     payments = db.Column(JSON, nullable=False, default=list)
-    paid = db.Column(BOOLEAN, nullable=False, default=False, index=True)
+    paid = db.Column(BOOLEAN, nullable=False, default=False)
     paid_at = db.Column(DATETIME)
     channel = db.Column(VARCHAR(50))
     store = db.Column(JSON, default=dict)
@@ -69,17 +96,45 @@ class Order(db.Model):
 
     order_payments = db.relationship("Payment", backref="order", cascade="all, delete-orphan")
     slips = db.relationship("TransferSlip", backref="order", cascade="all, delete-orphan")
+    detections = db.relationship("Detection", backref="order", passive_deletes=True)
+    line_items = db.relationship("OrderItem", backref="order", cascade="all, delete-orphan")
+
+
+class OrderItem(db.Model):
+    """Normalized copy of ``Order.items`` for item-level SQL aggregates."""
+
+    __tablename__ = "order_items"
+    __table_args__ = (
+        db.Index("ix_order_items_product_created", "product_id", "created_at"),
+        db.Index("ix_order_items_color_created", "color", "created_at"),
+    )
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
+    order_id = db.Column(
+        BIGINT(unsigned=True),
+        db.ForeignKey("orders.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    created_at = db.Column(DATETIME, nullable=False, index=True)
+    item_key = db.Column(VARCHAR(100), nullable=False)
+    product_id = db.Column(BIGINT(unsigned=True))
+    color = db.Column(VARCHAR(50))
+    name = db.Column(VARCHAR(255))
+    qty = db.Column(db.Integer, nullable=False, default=0)
+    price = db.Column(DECIMAL(12, 2), nullable=False, default=0)
+    amount = db.Column(DECIMAL(12, 2), nullable=False, default=0)
 
 
 class Payment(db.Model):
     __tablename__ = "payments"
+    __table_args__ = (db.Index("ix_payments_order_time", "order_id", "time"),)
 
     id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
     order_id = db.Column(
         BIGINT(unsigned=True),
         db.ForeignKey("orders.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
     method = db.Column(VARCHAR(50), nullable=False)
     amount = db.Column(DECIMAL(12, 2), nullable=False)
@@ -87,10 +142,16 @@ class Payment(db.Model):
     change = db.Column(DECIMAL(12, 2), nullable=False)
     time = db.Column(DATETIME, nullable=False, default=datetime.utcnow)
     ref = db.Column(TEXT)
+    qr_image_url = db.Column(TEXT)
 
 
 class TransferSlip(db.Model):
     __tablename__ = "transfer_slips"
+    # Prefix indexes: both columns are TEXT (flask data migrate-slips matches on them)
+    __table_args__ = (
+        db.Index("ix_transfer_slips_filename", "filename", mysql_length=191),
+        db.Index("ix_transfer_slips_file_path", "file_path", mysql_length=255),
+    )
 
     id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
     order_id = db.Column(
@@ -99,12 +160,208 @@ class TransferSlip(db.Model):
         nullable=False,
         index=True,
     )
-    payment_id = db.Column(BIGINT(unsigned=True), db.ForeignKey("payments.id", ondelete="CASCADE"))
+    payment_id = db.Column(
+        BIGINT(unsigned=True),
+        db.ForeignKey("payments.id", ondelete="CASCADE"),
+        index=True,
+    )
     filename = db.Column(TEXT, nullable=False)
     file_path = db.Column(TEXT, nullable=False)
     file_size = db.Column(db.Integer, nullable=False)
     mime_type = db.Column(TEXT, nullable=False)
     upload_time = db.Column(DATETIME, nullable=False, default=datetime.utcnow)
+    # Set for slips the client only referenced by URL (no file on our disk).
+    slip_url = db.Column(TEXT)
+
+
+class OrderArchive(db.Model):
+    """Cold copy of ``orders`` rows older than ``ARCHIVE_AFTER_DAYS`` (same ids)."""
+
+    __tablename__ = "orders_archive"
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=False)
+    client_id = db.Column(VARCHAR(64), unique=True)
+    detection_hash = db.Column(VARCHAR(64))
+    created_at = db.Column(DATETIME, nullable=False, index=True)
+    items = db.Column(JSON, nullable=False, default=list)
+    persons = db.Column(db.Integer, nullable=False, default=1)
+    split_mode = db.Column(VARCHAR(50), nullable=False, default="NONE")
+    payments = db.Column(JSON, nullable=False, default=list)
+    paid = db.Column(BOOLEAN, nullable=False, default=False)
+    paid_at = db.Column(DATETIME)
+    channel = db.Column(VARCHAR(50))
+    store = db.Column(JSON, default=dict)
+    subtotal = db.Column(DECIMAL(12, 2), nullable=False, default=0)
+    discount = db.Column(DECIMAL(12, 2), nullable=False, default=0)
+    service = db.Column(DECIMAL(12, 2), nullable=False, default=0)
+    vat = db.Column(DECIMAL(12, 2), nullable=False, default=0)
+    total = db.Column(DECIMAL(12, 2), nullable=False)
+    archived_at = db.Column(DATETIME, nullable=False, default=datetime.utcnow)
+
+    # Same relationship names as Order so serializers work on either.
+    order_payments = db.relationship("PaymentArchive", cascade="all, delete-orphan")
+    slips = db.relationship("TransferSlipArchive", cascade="all, delete-orphan")
+    line_items = db.relationship("OrderItemArchive", cascade="all, delete-orphan")
+
+
+class OrderItemArchive(db.Model):
+    __tablename__ = "order_items_archive"
+    __table_args__ = (
+        db.Index("ix_order_items_archive_product_created", "product_id", "created_at"),
+        db.Index("ix_order_items_archive_color_created", "color", "created_at"),
+    )
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=False)
+    order_id = db.Column(
+        BIGINT(unsigned=True),
+        db.ForeignKey("orders_archive.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    created_at = db.Column(DATETIME, nullable=False, index=True)
+    item_key = db.Column(VARCHAR(100), nullable=False)
+    product_id = db.Column(BIGINT(unsigned=True))
+    color = db.Column(VARCHAR(50))
+    name = db.Column(VARCHAR(255))
+    qty = db.Column(db.Integer, nullable=False, default=0)
+    price = db.Column(DECIMAL(12, 2), nullable=False, default=0)
+    amount = db.Column(DECIMAL(12, 2), nullable=False, default=0)
+
+
+class PaymentArchive(db.Model):
+    __tablename__ = "payments_archive"
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=False)
+    order_id = db.Column(
+        BIGINT(unsigned=True),
+        db.ForeignKey("orders_archive.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    method = db.Column(VARCHAR(50), nullable=False)
+    amount = db.Column(DECIMAL(12, 2), nullable=False)
+    received = db.Column(DECIMAL(12, 2), nullable=False)
+    change = db.Column(DECIMAL(12, 2), nullable=False)
+    time = db.Column(DATETIME, nullable=False)
+    ref = db.Column(TEXT)
+    qr_image_url = db.Column(TEXT)
+
+
+class TransferSlipArchive(db.Model):
+    __tablename__ = "transfer_slips_archive"
+    # Prefix indexes: both columns are TEXT (flask data migrate-slips matches on them)
+    __table_args__ = (
+        db.Index("ix_transfer_slips_archive_filename", "filename", mysql_length=191),
+        db.Index("ix_transfer_slips_archive_file_path", "file_path", mysql_length=255),
+    )
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=False)
+    order_id = db.Column(
+        BIGINT(unsigned=True),
+        db.ForeignKey("orders_archive.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    payment_id = db.Column(BIGINT(unsigned=True), index=True)
+    filename = db.Column(TEXT, nullable=False)
+    file_path = db.Column(TEXT, nullable=False)
+    file_size = db.Column(db.Integer, nullable=False)
+    mime_type = db.Column(TEXT, nullable=False)
+    upload_time = db.Column(DATETIME, nullable=False)
+    slip_url = db.Column(TEXT)
+
+
+class Detection(db.Model):
+    __tablename__ = "detections"
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
+    image_hash = db.Column(VARCHAR(64), nullable=False, index=True)
+    created_at = db.Column(DATETIME, nullable=False, default=datetime.utcnow, index=True)
+    store = db.Column(VARCHAR(100), index=True)
+    profile = db.Column(VARCHAR(50))
+    model_version = db.Column(VARCHAR(255))
+    counts = db.Column(JSON, nullable=False, default=dict)
+    total_items = db.Column(db.Integer, nullable=False, default=0)
+    roi = db.Column(JSON)
+    timings = db.Column(JSON)
+    order_id = db.Column(
+        BIGINT(unsigned=True),
+        db.ForeignKey("orders.id", ondelete="SET NULL"),
+        index=True,
+    )
+
+
+class SalesRollupHourly(db.Model):
+    __tablename__ = "sales_rollups_hourly"
+    __table_args__ = (
+        db.UniqueConstraint("bucket", "dimension", "dim_key", name="uq_sales_rollups_hourly"),
+    )
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
+    bucket = db.Column(DATETIME, nullable=False)
+    dimension = db.Column(VARCHAR(20), nullable=False)
+    dim_key = db.Column(VARCHAR(255), nullable=False, default="")
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(DECIMAL(14, 2), nullable=False, default=0)
+    amount = db.Column(DECIMAL(14, 2), nullable=False, default=0)
+
+
+class SalesRollupDaily(db.Model):
+    __tablename__ = "sales_rollups_daily"
+    __table_args__ = (
+        db.UniqueConstraint("bucket", "dimension", "dim_key", name="uq_sales_rollups_daily"),
+    )
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
+    bucket = db.Column(DATETIME, nullable=False)
+    dimension = db.Column(VARCHAR(20), nullable=False)
+    dim_key = db.Column(VARCHAR(255), nullable=False, default="")
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(DECIMAL(14, 2), nullable=False, default=0)
+    amount = db.Column(DECIMAL(14, 2), nullable=False, default=0)
+
+
+class IdempotencyKey(db.Model):
+    """Stored responses for retried POSTs carrying an ``Idempotency-Key`` header."""
+
+    __tablename__ = "idempotency_keys"
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
+    key = db.Column(VARCHAR(128), unique=True, nullable=False)
+    fingerprint = db.Column(VARCHAR(64), nullable=False)
+    # NULL while the first request is still running.
+    status_code = db.Column(db.Integer)
+    response = db.Column(JSON)
+    created_at = db.Column(DATETIME, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(DATETIME, nullable=False, index=True)
+
+
+class UploadBlob(db.Model):
+    """One stored file, named by the SHA-256 of its bytes (shared by every ref to it)."""
+
+    __tablename__ = "upload_blobs"
+
+    sha256 = db.Column(VARCHAR(64), primary_key=True)
+    size = db.Column(BIGINT(unsigned=True), nullable=False)
+    mime_type = db.Column(VARCHAR(100), nullable=False)
+    created_at = db.Column(DATETIME, nullable=False, default=datetime.utcnow)
+
+
+class UploadRef(db.Model):
+    """Public upload filename (what URLs and rows carry) -> blob."""
+
+    __tablename__ = "upload_refs"
+    __table_args__ = (
+        db.UniqueConstraint("kind", "name", name="uq_upload_refs_kind_name"),
+        # Finds an earlier upload of the same bytes.
+        db.Index("ix_upload_refs_kind_blob", "kind", "blob_sha256"),
+    )
+
+    id = db.Column(BIGINT(unsigned=True), primary_key=True, autoincrement=True)
+    kind = db.Column(VARCHAR(16), nullable=False)
+    name = db.Column(VARCHAR(255), nullable=False)
+    blob_sha256 = db.Column(VARCHAR(64), db.ForeignKey("upload_blobs.sha256"), nullable=False)
+    created_at = db.Column(DATETIME, nullable=False, default=datetime.utcnow)
 
 
 class Announcement(db.Model):
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation
+from typing import Iterable
+
+from sqlalchemy import insert
+
+from app.database import db
+from app.models import Order, OrderItem
+
+
+# Bounds of the order_items columns: qty INT, price/amount DECIMAL(12,2).
+_MAX_QTY = 2**31
+_MAX_AMOUNT = Decimal(10) ** 10
+
+
+def _decimal(value, limit: Decimal = _MAX_AMOUNT) -> Decimal:
+    """``value`` as a Decimal; unparseable, non-finite or out-of-range values count as 0."""
+    try:
+        number = Decimal(str(value or 0))
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+    if not number.is_finite() or abs(number) >= limit:
+        return Decimal(0)
+    return number
+
+
+def order_item_rows(order: Order) -> list[dict]:
+    """Flatten ``order.items`` into ``order_items`` rows (order must be flushed)."""
+    rows = []
+    for item in order.items or []:
+        if not isinstance(item, dict):
+            continue
+        raw_id = item.get("id")
+        key = str(raw_id if raw_id is not None else item.get("name") or "")
+        product_id = None
+        if isinstance(raw_id, int) or (isinstance(raw_id, str) and raw_id.isdigit()):
+            product_id = int(raw_id) if 0 <= int(raw_id) < 2**63 else None
+
+        color = item.get("color")
+        if not color and key.startswith("color-"):
+            color = key[len("color-") :]
+
+        qty = int(_decimal(item.get("qty"), _MAX_QTY))
+        price = _decimal(item.get("price"))
+        if abs(price * qty) >= _MAX_AMOUNT:
+            qty = 0
+        rows.append(
+            {
+                "order_id": order.id,
+                "created_at": order.created_at,
+                "item_key": key[:100],
+                "product_id": product_id,
+                "color": str(color).lower()[:50] if color else None,
+                "name": str(item.get("name") or "")[:255] or None,
+                "qty": qty,
+                "price": price,
+                "amount": price * qty,
+            }
+        )
+    return rows
+
+
+def write_order_items(orders: Iterable[Order]) -> int:
+    """Insert line items for ``orders`` with one multi-row INSERT."""
+    rows = [row for order in orders for row in order_item_rows(order)]
+    if rows:
+        db.session.execute(insert(OrderItem), rows)
+    return len(rows)
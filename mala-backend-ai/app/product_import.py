@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from app.database import db
+from app.models import Product
+from app.utils import normalize_product_image
+
+
+# Columns accepted in CSV headers / JSON objects.
+FIELDS = ("name", "price", "category", "stock", "active", "color", "image")
+
+_TRUE = {"1", "true", "yes", "y", "on"}
+_FALSE = {"0", "false", "no", "n", "off", ""}
+
+
+def parse_csv(data: bytes) -> list[dict]:
+    """Rows of a UTF-8 CSV body; raises ``ValueError`` if it can't be read."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError as exc:
+        raise ValueError("CSV must be UTF-8 encoded") from exc
+    try:
+        return [
+            {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    except csv.Error as exc:
+        raise ValueError(f"invalid CSV: {exc}") from exc
+
+
+def _name_key(name: str) -> str:
+    """Import rows match products by name regardless of case, like the column's collation."""
+    return name.casefold()
+
+
+def _bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError("active must be true/false")
+
+
+def _clean(row: dict, host: str | None) -> dict:
+    """Validate one input row, returning only the fields it sets."""
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    if len(name) > 255:
+        raise ValueError("name is too long")
+
+    cleaned: dict = {"name": name}
+    if row.get("price") not in (None, ""):
+        try:
+            price = Decimal(str(row["price"]))
+        except InvalidOperation as exc:
+            raise ValueError("price must be a number") from exc
+        if not price.is_finite():
+            raise ValueError("price must be a number")
+        if price < 0:
+            raise ValueError("price must not be negative")
+        cleaned["price"] = price
+    if row.get("stock") not in (None, ""):
+        try:
+            cleaned["stock"] = int(str(row["stock"]).strip())
+        except ValueError as exc:
+            raise ValueError("stock must be an integer") from exc
+    if row.get("category") not in (None, ""):
+        cleaned["category"] = str(row["category"]).strip()[:100]
+    if "active" in row:
+        cleaned["active"] = _bool(row["active"])
+    if "color" in row:
+        cleaned["color"] = (str(row["color"]).strip() or None) if row["color"] is not None else None
+    if "image" in row:
+        cleaned["image"] = normalize_product_image(row.get("image"), host)
+    return cleaned
+
+
+def validate_rows(rows: list, host: str | None = None) -> tuple[list[tuple[int, dict]], list[dict]]:
+    """Validate every row up front; returns ``([(row_index, cleaned), ...], errors)``."""
+    cleaned_rows: list[tuple[int, dict]] = []
+    errors: list[dict] = []
+    seen: set[str] = set()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "error": "row must be an object"})
+            continue
+        try:
+            cleaned = _clean(row, host)
+        except ValueError as exc:
+            errors.append({"row": index, "name": row.get("name"), "error": str(exc)})
+            continue
+        key = _name_key(cleaned["name"])
+        if key in seen:
+            errors.append({"row": index, "name": cleaned["name"], "error": "duplicate name in import"})
+            continue
+        seen.add(key)
+        cleaned_rows.append((index, cleaned))
+    return cleaned_rows, errors
+
+
+def resolve_rows(rows: list[tuple[int, dict]]) -> tuple[list[dict], int, list[dict]]:
+    """Merge validated rows with existing products (matched by name, one locking query).
+
+    Returns ``(values, created_count, errors)`` where ``values`` are complete
+    ``products`` rows ready for the upsert (``id`` set for existing products).
+    """
+    names = [row["name"] for _, row in rows]
+    # Locked until the import commits: the upsert writes every field back, so
+    # a concurrent order must not change stock in between.
+    matched = Product.query.filter(Product.name.in_(names)).with_for_update().all()
+    existing = {_name_key(product.name): product for product in matched}
+
+    values: list[dict] = []
+    created = 0
+    errors: list[dict] = []
+    for index, row in rows:
+        current = existing.get(_name_key(row["name"]))
+        if current is None:
+            if not row.get("category"):
+                errors.append({"row": index, "name": row["name"], "error": "category is required for new products"})
+                continue
+            created += 1
+            values.append(
+                {
+                    "id": None,
+                    "name": row["name"],
+                    "price": row.get("price", Decimal(0)),
+                    "category": row["category"],
+                    "stock": row.get("stock", 0),
+                    "active": row.get("active", True),
+                    "color": row.get("color"),
+                    "image": row.get("image", ""),
+                }
+            )
+            continue
+        values.append(
+            {
+                "id": current.id,
+                "name": current.name,
+                "price": row.get("price", current.price),
+                "category": row.get("category", current.category),
+                "stock": row.get("stock", current.stock),
+                "active": row.get("active", current.active),
+                "color": row.get("color", current.color),
+                "image": row.get("image", current.image),
+            }
+        )
+    return values, created, errors
+
+
+def upsert_products(values: list[dict], batch: int = 500) -> None:
+    """Write ``values`` with multi-row INSERT ... ON DUPLICATE KEY UPDATE batches."""
+    table = Product.__table__
+    for start in range(0, len(values), batch):
+        stmt = mysql_insert(table).values(values[start : start + batch])
+        stmt = stmt.on_duplicate_key_update(
+            {column: stmt.inserted[column] for column in FIELDS}
+        )
+        db.session.execute(stmt)
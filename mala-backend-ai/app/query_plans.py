@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, or_, select
+
+from app.database import db
+from app.models import (
+    Detection,
+    IdempotencyKey,
+    Order,
+    OrderItem,
+    Payment,
+    SalesRollupDaily,
+    TransferSlip,
+    UploadRef,
+    User,
+)
+
+
+queries_cli = AppGroup("queries", help="Query plan checks for the hot paths.")
+
+
+def hot_queries() -> dict:
+    """The statements behind the busiest endpoints, keyed by a short name."""
+    now = datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+    return {
+        "login": select(User).where(User.username_lower == "admin"),
+        "orders.paid_newest": (
+            select(Order)
+            .where(Order.paid == True)  # noqa: E712
+            .order_by(Order.created_at.desc(), Order.id.desc())
+            .limit(100)
+        ),
+        "orders.paid_range": (
+            select(Order)
+            .where(Order.paid == True, Order.created_at >= week_ago)  # noqa: E712
+            .order_by(Order.created_at.desc(), Order.id.desc())
+        ),
+        "orders.client_ids": select(Order.client_id, Order.id).where(Order.client_id.in_(["a", "b"])),
+        "orders.archive_candidates": (
+            select(Order.id).where(Order.created_at < week_ago).order_by(Order.created_at.asc()).limit(500)
+        ),
+        "payments.by_order": (
+            select(Payment).where(Payment.order_id.in_([1, 2, 3])).order_by(Payment.order_id, Payment.time)
+        ),
+        "payments.order_total": select(func.sum(Payment.amount)).where(Payment.order_id == 1),
+        "slips.by_order": select(TransferSlip).where(TransferSlip.order_id.in_([1, 2, 3])),
+        "slips.flat_files": select(TransferSlip).where(
+            or_(TransferSlip.file_path.in_(["/x/a.jpg", "/x/b.jpg"]), TransferSlip.filename.in_(["a.jpg", "b.jpg"]))
+        ),
+        "order_items.by_color": (
+            select(OrderItem.color, func.sum(OrderItem.amount))
+            .where(OrderItem.color == "red", OrderItem.created_at >= week_ago)
+            .group_by(OrderItem.color)
+        ),
+        "rollups.summary": select(SalesRollupDaily).where(
+            SalesRollupDaily.dimension == "total", SalesRollupDaily.bucket >= week_ago
+        ),
+        "detections.by_hash": select(Detection).where(Detection.image_hash == "0" * 64),
+        "idempotency.by_key": select(IdempotencyKey).where(IdempotencyKey.key == "k"),
+        "uploads.ref": select(UploadRef.blob_sha256).where(UploadRef.kind == "slip", UploadRef.name == "x.jpg"),
+        "uploads.dedupe": select(UploadRef.name).where(UploadRef.kind == "product", UploadRef.blob_sha256 == "0" * 64),
+    }
+
+
+def explain(statement) -> list[dict]:
+    bind = db.session.get_bind()
+    compiled = statement.compile(dialect=bind.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    result = db.session.connection().exec_driver_sql(f"EXPLAIN {compiled}", params)
+    return [dict(row) for row in result.mappings()]
+
+
+@queries_cli.command("explain")
+@click.option("--verbose", "-v", is_flag=True, help="Print every plan row, not just failures.")
+def explain_command(verbose: bool) -> None:
+    """EXPLAIN each hot query and fail if any of them does a full table scan.
+
+    Needs a MySQL/MariaDB database (point DATABASE_URL at a local copy);
+    on near-empty tables the optimizer may prefer scans, so run it against
+    realistic data.
+    """
+    if db.session.get_bind().dialect.name != "mysql":
+        raise click.ClickException("EXPLAIN check needs a MySQL-compatible database")
+
+    failures = []
+    for name, statement in hot_queries().items():
+        for row in explain(statement):
+            full_scan = str(row.get("type") or "").upper() == "ALL"
+            if full_scan:
+                failures.append(name)
+            if full_scan or verbose:
+                click.echo(
+                    f"{'FULL SCAN' if full_scan else 'ok':9} {name}: table={row.get('table')} "
+                    f"type={row.get('type')} key={row.get('key')} rows={row.get('rows')}"
+                )
+
+    if failures:
+        raise click.ClickException(f"Full table scan in: {', '.join(sorted(set(failures)))}")
+    click.echo(f"{len(hot_queries())} hot queries use indexes")
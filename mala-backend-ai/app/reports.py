@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import selectinload
+
+from app.database import db
+from app.models import Order, OrderArchive, SalesRollupDaily, SalesRollupHourly
+
+
+# Rollup dimensions: "total" (single key ""), "channel", "method", "item".
+DIMENSIONS = ("total", "channel", "method", "item")
+
+reports_cli = AppGroup("reports", help="Sales rollup maintenance.")
+
+
+def _to_decimal(value) -> Decimal:
+    try:
+        number = Decimal(str(value or 0))
+    except ArithmeticError:
+        return Decimal(0)
+    # NaN/Infinity from a client payload would poison every rollup row it touches.
+    return number if number.is_finite() else Decimal(0)
+
+
+def _local_time(value: datetime) -> datetime:
+    offset = float(current_app.config.get("REPORT_UTC_OFFSET", 0))
+    return value + timedelta(hours=offset)
+
+
+def _buckets(order: Order) -> tuple[datetime, datetime]:
+    local = _local_time(order.created_at or datetime.utcnow())
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    return hour, hour.replace(hour=0)
+
+
+def order_facts(order: Order) -> list[tuple[str, str, int, Decimal, Decimal]]:
+    """Break a paid order into ``(dimension, key, orders, quantity, amount)`` facts."""
+    items = order.items or []
+    quantity = sum(_to_decimal(item.get("qty")) for item in items if isinstance(item, dict))
+    total = _to_decimal(order.total)
+
+    facts = [
+        ("total", "", 1, quantity, total),
+        ("channel", order.channel or "", 1, quantity, total),
+    ]
+
+    by_method: dict[str, Decimal] = defaultdict(Decimal)
+    if order.order_payments:
+        for payment in order.order_payments:
+            by_method[payment.method or ""] += _to_decimal(payment.amount)
+    else:
+        for entry in order.payments or []:
+            if isinstance(entry, dict):
+                by_method[str(entry.get("method") or "")] += _to_decimal(entry.get("amount"))
+    for method, amount in by_method.items():
+        facts.append(("method", method, 1, Decimal(0), amount))
+
+    by_item: dict[str, list[Decimal]] = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        key = str(item.get("id") or item.get("color") or item.get("name") or "")
+        qty = _to_decimal(item.get("qty"))
+        by_item[key][0] += qty
+        by_item[key][1] += qty * _to_decimal(item.get("price"))
+    for key, (qty, amount) in by_item.items():
+        facts.append(("item", key[:255], 1, qty, amount))
+
+    return facts
+
+
+def _upsert(model, rows: list[dict]) -> None:
+    if not rows:
+        return
+    stmt = mysql_insert(model.__table__).values(rows)
+    stmt = stmt.on_duplicate_key_update(
+        orders=model.__table__.c.orders + stmt.inserted.orders,
+        quantity=model.__table__.c.quantity + stmt.inserted.quantity,
+        amount=model.__table__.c.amount + stmt.inserted.amount,
+    )
+    db.session.execute(stmt)
+
+
+def _accumulate(orders, hourly: dict, daily: dict) -> None:
+    for order in orders:
+        hour, day = _buckets(order)
+        for dimension, key, count, quantity, amount in order_facts(order):
+            for bucket, target in ((hour, hourly), (day, daily)):
+                slot = target.setdefault((bucket, dimension, key), [0, Decimal(0), Decimal(0)])
+                slot[0] += count
+                slot[1] += quantity
+                slot[2] += amount
+
+
+def _flush(hourly: dict, daily: dict) -> None:
+    for model, target in ((SalesRollupHourly, hourly), (SalesRollupDaily, daily)):
+        _upsert(
+            model,
+            [
+                {
+                    "bucket": bucket,
+                    "dimension": dimension,
+                    "dim_key": key,
+                    "orders": count,
+                    "quantity": quantity,
+                    "amount": amount,
+                }
+                for (bucket, dimension, key), (count, quantity, amount) in target.items()
+            ],
+        )
+
+
+def record_paid_orders(orders) -> None:
+    """Add newly paid orders to the rollups inside the caller's transaction."""
+    hourly: dict = {}
+    daily: dict = {}
+    _accumulate(orders, hourly, daily)
+    _flush(hourly, daily)
+
+
+def record_paid_order(order: Order) -> None:
+    record_paid_orders([order])
+
+
+@reports_cli.command("rebuild")
+@click.option("--since", default=None, help="Only rebuild buckets from this date (YYYY-MM-DD).")
+@click.option("--batch", default=500, show_default=True, help="Orders loaded per batch.")
+def rebuild_rollups(since: str | None, batch: int) -> None:
+    """Recompute sales rollups from paid orders, archived ones included."""
+    offset = timedelta(hours=float(current_app.config.get("REPORT_UTC_OFFSET", 0)))
+    since_local = datetime.fromisoformat(since) if since else None
+
+    for model in (SalesRollupHourly, SalesRollupDaily):
+        query = model.query
+        if since_local:
+            query = query.filter(model.bucket >= since_local)
+        query.delete(synchronize_session=False)
+
+    processed = 0
+    for model in (OrderArchive, Order):
+        last_id = 0
+        while True:
+            query = (
+                model.query.options(selectinload(model.order_payments))
+                .filter(model.paid == True, model.id > last_id)  # noqa: E712
+                .order_by(model.id.asc())
+            )
+            if since_local:
+                query = query.filter(model.created_at >= since_local - offset)
+            orders = query.limit(batch).all()
+            if not orders:
+                break
+            hourly: dict = {}
+            daily: dict = {}
+            _accumulate(orders, hourly, daily)
+            _flush(hourly, daily)
+            db.session.commit()
+            last_id = orders[-1].id
+            processed += len(orders)
+            db.session.expunge_all()
+
+    db.session.commit()
+    click.echo(f"Rebuilt rollups from {processed} paid orders")
@@ -6,6 +6,7 @@ from .auth import auth_bp
 from .orders import orders_bp
 from .payments import payments_bp
 from .products import products_bp
+from .reports import reports_bp
 from .uploads import uploads_bp
 from .users import users_bp
 
@@ -19,3 +20,4 @@ def register_routes(app: Flask) -> None:
     app.register_blueprint(orders_bp)
     app.register_blueprint(announcements_bp)
     app.register_blueprint(uploads_bp)
+    app.register_blueprint(reports_bp)
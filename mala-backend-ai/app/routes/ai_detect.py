@@ -1,13 +1,19 @@
 from __future__ import annotations
 
 import base64
+import hashlib
+import io
 import json
+import time
 from types import SimpleNamespace
 from typing import Any, Dict, List, Optional, Tuple
 
 from flask import Blueprint, current_app, jsonify, request
 import numpy as np
 
+from app.catalog import price_counts
+from app.detection_log import record_detection
+
 
 ai_bp = Blueprint("ai", __name__, url_prefix="/api")
 
@@ -29,9 +35,20 @@ COLOR_MAP = {
 }
 
 
-def build_context() -> Dict[str, Any]:
+def resolve_profile(name: Optional[str] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    cfg = current_app.config
+    profiles = cfg.get("DETECT_PROFILES") or {}
+    key = (name or cfg.get("DETECT_PROFILE") or "balanced").strip().lower()
+    if key not in profiles:
+        return None, None
+    return key, profiles[key]
+
+
+def build_context(profile: Optional[str] = None) -> Dict[str, Any]:
     cfg = current_app.config
     ai_state = current_app.extensions.get("ai", {})
+    profile_name, settings = resolve_profile(profile)
+    settings = settings or {}
 
     sv_min = int(cfg.get("SV_MIN", 50))
 
@@ -49,15 +66,19 @@ def build_context() -> Dict[str, Any]:
         "np": ai_state.get("np"),
         "Image": ai_state.get("Image"),
         "ImageOps": ai_state.get("ImageOps"),
-        "conf": float(cfg.get("CONF", 0.35)),
-        "iou": float(cfg.get("IOU", 0.50)),
-        "img": int(cfg.get("IMG_SIZE", cfg.get("IMG", 1024))),
+        "profile": profile_name,
+        "refine": bool(settings.get("refine", True)),
+        "color_override": bool(settings.get("color_override", True)),
+        "inferences": 0,
+        "conf": float(settings.get("conf", cfg.get("CONF", 0.35))),
+        "iou": float(settings.get("iou", cfg.get("IOU", 0.50))),
+        "img": int(settings.get("img", cfg.get("IMG_SIZE", cfg.get("IMG", 1024)))),
         "color_override_min": float(cfg.get("COLOR_OVERRIDE_MIN", 0.60)),
         "model_trust": float(cfg.get("MODEL_TRUST", 0.62)),
         "center_shrink": float(cfg.get("CENTER_SHRINK", 0.60)),
         "sv_min": sv_min,
         "min_pixels": int(cfg.get("MIN_PIXELS", 60)),
-        "roi_scales": list(cfg.get("ROI_SCALES", [0.90, 1.00, 1.15, 1.30, 1.45])),
+        "roi_scales": list(settings.get("roi_scales", cfg.get("ROI_SCALES", [0.90, 1.00, 1.15, 1.30, 1.45]))),
         "respect_user_roi": bool(cfg.get("RESPECT_USER_ROI", True)),
         "user_pad": float(cfg.get("USER_PAD", 0.10)),
         "edge_margin": float(cfg.get("EDGE_MARGIN", 0.08)),
@@ -253,6 +274,7 @@ def predict_on_roi(ctx: Dict[str, Any], arr_bgr_full, roi):
             boxes=None,
         )
         return [], empty
+    ctx["inferences"] += 1
     result = model.predict(
         Image.fromarray(cv2.cvtColor(crop_bgr, cv2.COLOR_BGR2RGB)),
         conf=ctx["conf"],
@@ -435,13 +457,19 @@ def health():
             "conf": ctx.get("conf"),
             "iou": ctx.get("iou"),
             "img": ctx.get("img"),
+            "profile": ctx.get("profile"),
+            "profiles": sorted((current_app.config.get("DETECT_PROFILES") or {}).keys()),
         }
     )
 
 
 @ai_bp.post("/detect")
 def detect():
-    ctx = build_context()
+    profile = request.form.get("profile") or request.args.get("profile")
+    if resolve_profile(profile)[0] is None:
+        return jsonify({"error": f"unknown detect profile '{profile}'"}), 400
+
+    ctx = build_context(profile)
     missing = _missing_components(ctx)
     if missing:
         return jsonify({"error": f"AI component '{missing}' not available"}), 503
@@ -456,13 +484,20 @@ def detect():
     if not file:
         return jsonify({"error": "file field required (image or file)"}), 400
 
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    raw = file.read()
+    image_hash = hashlib.sha256(raw).hexdigest()
+
     try:
-        img = Image.open(file.stream)
+        img = Image.open(io.BytesIO(raw))
         img = ImageOps.exif_transpose(img).convert("RGB")
     except Exception:
         return jsonify({"error": "invalid image"}), 400
 
     arr_bgr_full = cv2.cvtColor(np_mod.array(img), cv2.COLOR_RGB2BGR)
+    timings["decode_ms"] = (time.perf_counter() - started) * 1000.0
     H, W = arr_bgr_full.shape[:2]
 
     user_roi = None
@@ -484,6 +519,7 @@ def detect():
             user_roi = None
 
     try:
+        mark = time.perf_counter()
         if user_roi and ctx["respect_user_roi"]:
             rx1, ry1, rx2, ry2 = pad_roi(*user_roi, width=W, height=H, pad_frac=ctx["user_pad"])
             dets_raw, result = predict_on_roi(ctx, arr_bgr_full, (rx1, ry1, rx2, ry2))
@@ -507,7 +543,10 @@ def detect():
                 }
             )
 
-        if not (ctx["respect_user_roi"] and user_roi):
+        timings["detect_ms"] = (time.perf_counter() - mark) * 1000.0
+
+        mark = time.perf_counter()
+        if ctx["refine"] and not (ctx["respect_user_roi"] and user_roi):
             roi2, changed = tighten_roi_by_dets(ctx, detections, rx1, ry1, rx2, ry2, pad_ratio=0.12, min_boxes=6)
             if not changed:
                 roi2, changed = refine_roi_with_color_mask(ctx, arr_bgr_full, (rx1, ry1, rx2, ry2), sv_min=ctx["sv_min"])
@@ -530,17 +569,22 @@ def detect():
                         }
                     )
 
+        timings["refine_ms"] = (time.perf_counter() - mark) * 1000.0
+
         if ctx["respect_user_roi"] and user_roi:
             detections = filter_dets_inside(detections, (rx1, ry1, rx2, ry2), shrink=0.03)
 
-        for det in detections:
-            x1, y1, x2, y2 = map(int, det["box"])
-            crop = arr_bgr_full[max(0, y1) : max(0, y2), max(0, x1) : max(0, x2)]
-            if crop.size == 0:
-                continue
-            best_color, score = classify_color(ctx, crop)
-            if best_color and score >= ctx["color_override_min"] and det["confidence"] < ctx["model_trust"]:
-                det["label"] = best_color
+        mark = time.perf_counter()
+        if ctx["color_override"]:
+            for det in detections:
+                x1, y1, x2, y2 = map(int, det["box"])
+                crop = arr_bgr_full[max(0, y1) : max(0, y2), max(0, x1) : max(0, x2)]
+                if crop.size == 0:
+                    continue
+                best_color, score = classify_color(ctx, crop)
+                if best_color and score >= ctx["color_override_min"] and det["confidence"] < ctx["model_trust"]:
+                    det["label"] = best_color
+        timings["color_ms"] = (time.perf_counter() - mark) * 1000.0
 
         detections = dedupe_by_center(detections, threshold=0.45)
 
@@ -555,17 +599,38 @@ def detect():
             cv2.rectangle(canvas, (ux1, uy1), (ux2, uy2), (0, 255, 255), 2)
 
         annotated = draw(ctx, canvas, detections)
-
-        return jsonify(
-            {
-                "counts": counts,
-                "total_items": sum(counts.values()),
-                "detections": detections,
-                "roi": {"x1": rx1, "y1": ry1, "x2": rx2, "y2": ry2},
-                "annotated": annotated,
-            }
+        timings["total_ms"] = (time.perf_counter() - started) * 1000.0
+
+        roi = {"x1": rx1, "y1": ry1, "x2": rx2, "y2": ry2}
+        timings_ms = {key: round(value, 1) for key, value in timings.items()}
+        record_detection(
+            image_hash,
+            counts,
+            roi,
+            timings_ms,
+            profile=ctx["profile"],
+            store=request.form.get("store") or request.args.get("store"),
         )
 
+        payload = {
+            "imageHash": image_hash,
+            "counts": counts,
+            "total_items": sum(counts.values()),
+            "detections": detections,
+            "roi": roi,
+            "annotated": annotated,
+            "profile": ctx["profile"],
+            "cost": {
+                "inferences": ctx["inferences"],
+                "imgsz": ctx["img"],
+                "roi_candidates": len(ctx["roi_scales"]),
+                "timings_ms": timings_ms,
+            },
+        }
+        if (request.form.get("bill") or request.args.get("bill")) == "1":
+            payload["bill"] = price_counts(counts)
+        return jsonify(payload)
+
     except Exception as exc:  # pragma: no cover - defensive guard for production
         current_app.logger.exception("AI detect failed")
         return jsonify({"error": "AI processing failed", "details": str(exc)}), 500
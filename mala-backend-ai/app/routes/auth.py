@@ -1,5 +1,4 @@
 from flask import Blueprint, jsonify, request
-from sqlalchemy import func
 
 from app.auth import verify_password
 from app.models import User
@@ -17,7 +16,7 @@ def login():
     if not username or not password:
         return jsonify({"error": "กรุณาระบุชื่อผู้ใช้และรหัสผ่าน"}), 400
 
-    user = User.query.filter(func.lower(User.username) == username).first()
+    user = User.query.filter(User.username_lower == username).first()
     if not user:
         return jsonify({"error": "ไม่พบบัญชีผู้ใช้"}), 404
     if not user.active:
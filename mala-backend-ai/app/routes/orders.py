@@ -1,116 +1,331 @@
 from __future__ import annotations
 
+import csv
+import io
 import json
-from datetime import datetime
+import math
+from datetime import datetime, timezone
 from pathlib import Path
 
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import and_, func, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 
+from app.archive import includes_archive
+from app.blob_store import blob_store
+from app.catalog import bump_catalog_version
 from app.database import db
-from app.models import Order, Payment, TransferSlip
-from app.utils import abs_url_for
+from app.detection_log import link_detection_to_order
+from app.idempotency import idempotent
+from app.models import Order, OrderArchive, Payment, TransferSlip, TransferSlipArchive
+from app.order_items import write_order_items
+from app.reports import record_paid_order, record_paid_orders
+from app.slip_index import slip_index
+from app.stock import StockDemand, decrement_stock, stock_shortages
+from app.utils import decode_cursor, encode_cursor, file_url, parse_datetime_arg, referenced_slip
 
 
 orders_bp = Blueprint("orders", __name__, url_prefix="/api")
 
 
-@orders_bp.get("/orders")
-def list_orders():
-    orders = Order.query.filter_by(paid=True).order_by(Order.created_at.desc()).all()
-    uploads_dir = Path(current_app.config["UPLOAD_FOLDER"])
-    response: list[dict] = []
-
-    for order in orders:
-        payments = (
-            Payment.query.filter_by(order_id=order.id)
-            .order_by(Payment.time.asc())
-            .all()
-        )
+def _serialize_order(order: Order | OrderArchive) -> dict:
+    """Build the order payload from its already-loaded payments and slips."""
+    slip_files = slip_index()
+    blobs = blob_store()
+    payments = sorted(order.order_payments, key=lambda p: (p.time or datetime.min, p.id))
 
-        slips_by_payment: dict[int, list[dict]] = {}
-        slips = TransferSlip.query.filter_by(order_id=order.id).all()
-        for slip in slips:
+    slips_by_payment: dict[int, list[dict]] = {}
+    for slip in order.slips:
+        if slip.slip_url:
+            slip_url = slip.slip_url
+        elif blobs.owns(slip.file_path):
+            slip_url = file_url("uploads.serve_slip", slip.filename)
+        else:
             filename = Path(slip.file_path).name
-            file_path = uploads_dir / filename
-            slip_url = abs_url_for("uploads.serve_slip", filename=filename) if file_path.exists() else None
-            slips_by_payment.setdefault(slip.payment_id or 0, []).append(
-                {
-                    "slipUrl": slip_url,
-                    "name": slip.filename,
-                    "uploadTime": slip.upload_time.isoformat() if slip.upload_time else None,
-                    "size": slip.file_size,
-                    "mimeType": slip.mime_type,
-                    "slipId": slip.id,
-                }
-            )
+            slip_url = file_url("uploads.serve_slip", filename) if filename in slip_files else None
+        slips_by_payment.setdefault(slip.payment_id or 0, []).append(
+            {
+                "slipUrl": slip_url,
+                "name": slip.filename,
+                "uploadTime": slip.upload_time.isoformat() if slip.upload_time else None,
+                "size": slip.file_size,
+                "mimeType": slip.mime_type,
+                "slipId": slip.id,
+            }
+        )
 
-        payments_payload = []
-        for payment in payments:
-            slips_for_payment = slips_by_payment.get(payment.id, [])
-            qr_image_url = None
-
-            if payment.ref:
-                try:
-                    ref_data = json.loads(payment.ref) if isinstance(payment.ref, str) else payment.ref
-                except json.JSONDecodeError:
-                    ref_data = None
-
-                if isinstance(ref_data, dict):
-                    if "slips" in ref_data:
-                        for slip in ref_data["slips"]:
-                            slips_for_payment.append(slip)
-                    if "qrImageUrl" in ref_data:
-                        qr_image_url = ref_data.get("qrImageUrl")
-                    elif "slipUrl" in ref_data:
-                        qr_image_url = ref_data.get("slipUrl")
-
-            if not qr_image_url and slips_for_payment:
-                qr_image_url = slips_for_payment[0].get("slipUrl")
-
-            payments_payload.append(
-                {
-                    "id": payment.id,
-                    "method": payment.method,
-                    "amount": float(payment.amount),
-                    "received": float(payment.received),
-                    "change": float(payment.change),
-                    "time": payment.time.isoformat() if payment.time else None,
-                    "ref": payment.ref,
-                    "transferSlips": slips_for_payment,
-                    "qrImageUrl": qr_image_url,
-                }
-            )
+    payments_payload = []
+    for payment in payments:
+        slips_for_payment = slips_by_payment.get(payment.id, [])
+        qr_image_url = payment.qr_image_url
+        if not qr_image_url and slips_for_payment:
+            qr_image_url = slips_for_payment[0].get("slipUrl")
 
-        total_paid = sum(float(payment.amount) for payment in payments)
-        response.append(
+        payments_payload.append(
             {
-                "id": order.id,
-                "createdAt": order.created_at.isoformat() if order.created_at else None,
-                "items": order.items,
-                "persons": order.persons,
-                "splitMode": order.split_mode,
-                "payments": payments_payload,
-                "paid": order.paid,
-                "paidAt": order.paid_at.isoformat() if order.paid_at else None,
-                "channel": order.channel,
-                "store": order.store,
-                "subtotal": float(order.subtotal),
-                "discount": float(order.discount),
-                "service": float(order.service),
-                "vat": float(order.vat),
-                "total": float(order.total),
-                "totalPaid": total_paid,
+                "id": payment.id,
+                "method": payment.method,
+                "amount": float(payment.amount),
+                "received": float(payment.received),
+                "change": float(payment.change),
+                "time": payment.time.isoformat() if payment.time else None,
+                "ref": payment.ref,
+                "transferSlips": slips_for_payment,
+                "qrImageUrl": qr_image_url,
             }
         )
 
-    return jsonify(response)
+    total_paid = sum(float(payment.amount) for payment in payments)
+    return {
+        "id": order.id,
+        "createdAt": order.created_at.isoformat() if order.created_at else None,
+        "items": order.items,
+        "persons": order.persons,
+        "splitMode": order.split_mode,
+        "payments": payments_payload,
+        "paid": order.paid,
+        "paidAt": order.paid_at.isoformat() if order.paid_at else None,
+        "channel": order.channel,
+        "store": order.store,
+        "subtotal": float(order.subtotal),
+        "discount": float(order.discount),
+        "service": float(order.service),
+        "vat": float(order.vat),
+        "total": float(order.total),
+        "totalPaid": total_paid,
+    }
+
+
+def _order_sources(args) -> list[tuple]:
+    """Translate ``paid``/``from``/``to`` into ``[(model, criteria), ...]``.
+
+    The hot ``orders`` table always comes first; ``orders_archive`` is added
+    only when a ``from``/``to`` range reaches back into archived dates.
+    """
+    paid = args.get("paid", "1")
+    if paid not in ("0", "1", "all"):
+        raise ValueError("paid must be 0, 1 or all")
+    try:
+        start = parse_datetime_arg(args.get("from"))
+        end = parse_datetime_arg(args.get("to"), end=True)
+    except ValueError as exc:
+        raise ValueError("invalid from/to date") from exc
+
+    models = [Order, OrderArchive] if includes_archive(start, end) else [Order]
+    sources = []
+    for model in models:
+        filters = []
+        if paid != "all":
+            filters.append(model.paid == (paid == "1"))
+        if start:
+            filters.append(model.created_at >= start)
+        if end:
+            filters.append(model.created_at < end)
+        sources.append((model, filters))
+    return sources
+
+
+@orders_bp.get("/orders")
+def list_orders():
+    """List orders newest first.
+
+    Query args: ``paid`` (``1`` default, ``0`` or ``all``), ``from``/``to``
+    (date or ISO datetime; a bare ``to`` date is inclusive), ``limit`` and
+    ``cursor``. Passing ``limit`` or ``cursor`` switches to keyset pages of
+    ``{"orders": [...], "nextCursor": ...}``; without them older clients get
+    a bare array of the newest ``ORDERS_PAGE_MAX`` matches, with the cursor
+    for the rest in an ``X-Next-Cursor`` header.
+    """
+    args = request.args
+    try:
+        sources = _order_sources(args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    paginate = "limit" in args or "cursor" in args
+    cfg = current_app.config
+    try:
+        limit = int(args.get("limit", cfg.get("ORDERS_PAGE_SIZE", 100)))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    page_max = int(cfg.get("ORDERS_PAGE_MAX", 500))
+    limit = max(1, min(limit, page_max)) if paginate else page_max
+
+    cursor = None
+    if args.get("cursor"):
+        try:
+            cursor_at, cursor_id = decode_cursor(args["cursor"])
+            cursor = (datetime.fromisoformat(cursor_at), int(cursor_id))
+        except (TypeError, ValueError):
+            return jsonify({"error": "invalid cursor"}), 400
+
+    orders = []
+    for model, filters in sources:
+        # Payments and slips for the whole result set arrive in two IN queries.
+        query = model.query.options(
+            selectinload(model.order_payments), selectinload(model.slips)
+        ).filter(*filters)
+        if cursor is not None:
+            query = query.filter(
+                or_(
+                    model.created_at < cursor[0],
+                    and_(model.created_at == cursor[0], model.id < cursor[1]),
+                )
+            )
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+        orders.extend(query.limit(limit + 1).all())
+    if len(sources) > 1:
+        orders.sort(key=lambda order: (order.created_at, order.id), reverse=True)
+
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    if not paginate:
+        response = jsonify([_serialize_order(order) for order in orders])
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
+
+    return jsonify(
+        {
+            "orders": [_serialize_order(order) for order in orders],
+            "nextCursor": next_cursor,
+        }
+    )
+
+
+_EXPORT_COLUMNS = [
+    "id",
+    "createdAt",
+    "paidAt",
+    "channel",
+    "persons",
+    "splitMode",
+    "subtotal",
+    "discount",
+    "service",
+    "vat",
+    "total",
+    "totalPaid",
+    "payments",
+    "slipCount",
+    "items",
+]
+
+
+def _export_row(payload: dict) -> list:
+    payments = ";".join(f"{p['method']}:{p['amount']:.2f}" for p in payload["payments"])
+    slip_count = sum(len(p["transferSlips"]) for p in payload["payments"])
+    return [
+        payload["id"],
+        payload["createdAt"],
+        payload["paidAt"],
+        payload["channel"],
+        payload["persons"],
+        payload["splitMode"],
+        payload["subtotal"],
+        payload["discount"],
+        payload["service"],
+        payload["vat"],
+        payload["total"],
+        payload["totalPaid"],
+        payments,
+        slip_count,
+        json.dumps(payload["items"], ensure_ascii=False),
+    ]
+
+
+def _iter_order_chunks(model, filters: list, chunk_size: int):
+    """Yield lists of orders oldest first, one keyset-bounded query per chunk.
+
+    Each chunk loads its payments and slips with IN queries and is expunged
+    before the next one, so memory stays flat however long the range is.
+    """
+    last_at = None
+    last_id = 0
+    while True:
+        query = model.query.options(
+            selectinload(model.order_payments), selectinload(model.slips)
+        ).filter(*filters)
+        if last_at is not None:
+            query = query.filter(
+                or_(
+                    model.created_at > last_at,
+                    and_(model.created_at == last_at, model.id > last_id),
+                )
+            )
+        orders = query.order_by(model.created_at.asc(), model.id.asc()).limit(chunk_size).all()
+        if not orders:
+            return
+        last_at, last_id = orders[-1].created_at, orders[-1].id
+        yield orders
+        db.session.expunge_all()
+        if len(orders) < chunk_size:
+            return
+
+
+@orders_bp.get("/orders/export")
+def export_orders():
+    """Stream orders as NDJSON (default) or CSV for accounting.
+
+    Accepts the same ``paid``/``from``/``to`` filters as ``list_orders``.
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    try:
+        sources = _order_sources(request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    chunk_size = int(current_app.config.get("ORDERS_EXPORT_CHUNK", 500))
+
+    def generate():
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(_EXPORT_COLUMNS)
+            yield "\ufeff" + buffer.getvalue()
+        # Archived orders are older, so they go out first.
+        for model, filters in reversed(sources):
+            for orders in _iter_order_chunks(model, filters, chunk_size):
+                payloads = [_serialize_order(order) for order in orders]
+                if fmt == "ndjson":
+                    yield "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in payloads)
+                    continue
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(_export_row(p) for p in payloads)
+                yield buffer.getvalue()
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+    filename = f"orders-{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=f"{mimetype}; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
 
 @orders_bp.post("/orders")
+@idempotent
 def create_order():
+    """Save an order and take its items off stock in the same transaction.
+
+    With ``rejectOnInsufficientStock`` (default ``STOCK_REJECT_INSUFFICIENT``)
+    an order that stock can't cover is rolled back and answered with 409.
+    """
     data = request.get_json(force=True) or {}
+    detection_hash = data.get("detectionHash")
+    if not isinstance(detection_hash, str) or not 0 < len(detection_hash) <= 64:
+        detection_hash = None
 
     order = Order(
+        detection_hash=detection_hash,
         items=data.get("items", []),
         persons=data.get("persons", 1),
         split_mode=data.get("splitMode", "NONE"),
@@ -126,27 +341,240 @@ def create_order():
         total=data.get("total", 0),
     )
     db.session.add(order)
+    db.session.flush()
+    write_order_items([order])
+
+    cfg = current_app.config
+    demand = StockDemand([order]) if cfg.get("STOCK_TRACKING", True) else None
+    if demand:
+        strict = bool(data.get("rejectOnInsufficientStock", cfg.get("STOCK_REJECT_INSUFFICIENT", False)))
+        if not decrement_stock(demand, strict=strict):
+            db.session.rollback()
+            return jsonify({"error": "insufficient stock", "shortages": stock_shortages(demand)}), 409
+
+        bump_catalog_version(*demand.sections())
+
+    if order.paid:
+        record_paid_order(order)
     db.session.commit()
+    link_detection_to_order(detection_hash, order.id)
     return jsonify({"id": order.id}), 201
 
 
+def _client_time(value) -> datetime | None:
+    """Parse a client timestamp, normalising aware values to naive UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+_SYNC_AMOUNTS = ("subtotal", "discount", "service", "vat", "total")
+
+
+def _amount(value, field: str) -> float:
+    """A finite money value from a synced order; missing counts as 0."""
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, bool):
+        raise ValueError(f"{field} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number") from None
+    if not math.isfinite(number):
+        raise ValueError(f"{field} must be a number")
+    return number
+
+
+def _check_sync_entry(data: dict) -> None:
+    """Raise ``ValueError`` for an entry ``_sync_chunk`` could not write."""
+    for field in _SYNC_AMOUNTS:
+        _amount(data.get(field), field)
+    persons = data.get("persons", 1)
+    if isinstance(persons, bool) or not isinstance(persons, int):
+        raise ValueError("persons must be an integer")
+
+    items = data.get("items", [])
+    if not isinstance(items, list):
+        raise ValueError("items must be a list")
+    for item in items:
+        if isinstance(item, dict):
+            _amount(item.get("qty"), "items.qty")
+            _amount(item.get("price"), "items.price")
+
+    payments = data.get("payments") or []
+    if not isinstance(payments, list):
+        raise ValueError("payments must be a list")
+    for pay in payments:
+        if isinstance(pay, dict):
+            for field in ("amount", "received", "change"):
+                _amount(pay.get(field), f"payments.{field}")
+
+
+def _sync_order_values(data: dict, now: datetime) -> dict:
+    payments = data.get("payments") or []
+    total = _amount(data.get("total"), "total")
+    paid_sum = sum(_amount(p.get("amount"), "amount") for p in payments if isinstance(p, dict))
+    paid = bool(data["paid"]) if "paid" in data else paid_sum + 1e-6 >= total and total > 0
+    created_at = _client_time(data.get("createdAt")) or now
+    return {
+        "client_id": str(data["clientId"]),
+        "created_at": created_at,
+        "items": data.get("items", []),
+        "persons": data.get("persons", 1),
+        "split_mode": data.get("splitMode", "NONE"),
+        "payments": [],
+        "paid": paid,
+        "paid_at": (_client_time(data.get("paidAt")) or created_at) if paid else None,
+        "channel": data.get("channel"),
+        "store": data.get("store"),
+        "subtotal": _amount(data.get("subtotal"), "subtotal"),
+        "discount": _amount(data.get("discount"), "discount"),
+        "service": _amount(data.get("service"), "service"),
+        "vat": _amount(data.get("vat"), "vat"),
+        "total": total,
+    }
+
+
+def _sync_chunk(entries: list[dict]) -> dict[str, tuple[int, str]]:
+    """Insert one chunk of offline orders; returns ``{clientId: (id, status)}``."""
+    client_ids = [str(entry["clientId"]) for entry in entries]
+    existing = {}
+    for model in (OrderArchive, Order):
+        existing.update(
+            db.session.query(model.client_id, model.id).filter(model.client_id.in_(client_ids)).all()
+        )
+    results = {cid: (oid, "duplicate") for cid, oid in existing.items()}
+    fresh = [entry for entry in entries if str(entry["clientId"]) not in existing]
+    if not fresh:
+        return results
+
+    now = datetime.utcnow()
+    db.session.execute(insert(Order), [_sync_order_values(entry, now) for entry in fresh])
+    fresh_ids = [str(entry["clientId"]) for entry in fresh]
+    id_map = dict(
+        db.session.query(Order.client_id, Order.id).filter(Order.client_id.in_(fresh_ids)).all()
+    )
+
+    payment_rows = []
+    for entry in fresh:
+        order_id = id_map[str(entry["clientId"])]
+        for pay in entry.get("payments") or []:
+            if not isinstance(pay, dict) or not pay.get("method"):
+                continue
+            amount = _amount(pay.get("amount"), "amount")
+            received = pay.get("received")
+            payment_rows.append(
+                {
+                    "order_id": order_id,
+                    "method": pay["method"],
+                    "amount": amount,
+                    "received": amount if received is None else _amount(received, "received"),
+                    "change": _amount(pay.get("change"), "change"),
+                    "time": _client_time(pay.get("time")) or now,
+                    "ref": pay.get("ref") if isinstance(pay.get("ref"), str) else None,
+                    "qr_image_url": pay.get("qrImageUrl"),
+                }
+            )
+    if payment_rows:
+        db.session.execute(insert(Payment), payment_rows)
+
+    orders = (
+        Order.query.options(selectinload(Order.order_payments))
+        .filter(Order.id.in_(id_map.values()))
+        .all()
+    )
+    write_order_items(orders)
+    if current_app.config.get("STOCK_TRACKING", True):
+        # Orders already happened offline, so stock is never a reason to reject them.
+        demand = StockDemand(orders)
+        decrement_stock(demand)
+        bump_catalog_version(*demand.sections())
+    record_paid_orders([order for order in orders if order.paid])
+
+    for cid, oid in id_map.items():
+        results[cid] = (oid, "created")
+    return results
+
+
+@orders_bp.post("/orders/bulk")
+def bulk_create_orders():
+    """Ingest orders queued by a POS while offline.
+
+    Body: ``{"orders": [{"clientId": ..., <create_order fields>, "createdAt",
+    "payments": [{"method", "amount", "received", "change", "time"}]}]}``.
+    Orders are deduplicated by ``clientId`` and written with multi-row
+    INSERTs, one transaction per chunk of ``ORDERS_SYNC_CHUNK``.
+    """
+    data = request.get_json(force=True) or {}
+    entries = data.get("orders")
+    if not isinstance(entries, list):
+        return jsonify({"error": "orders must be a list"}), 400
+
+    results: dict[str, tuple[int | None, str]] = {}
+    valid: list[dict] = []
+    errors: list[dict] = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get("clientId"):
+            errors.append({"index": index, "error": "clientId required"})
+            continue
+        cid = str(entry["clientId"])
+        if len(cid) > 64:
+            errors.append({"index": index, "clientId": cid, "error": "clientId too long"})
+            continue
+        if cid in results:
+            continue
+        try:
+            _check_sync_entry(entry)
+        except ValueError as exc:
+            errors.append({"index": index, "clientId": cid, "error": str(exc)})
+            continue
+        results[cid] = (None, "pending")
+        valid.append(entry)
+
+    chunk_size = int(current_app.config.get("ORDERS_SYNC_CHUNK", 200))
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start : start + chunk_size]
+        for attempt in (1, 2):
+            try:
+                results.update(_sync_chunk(chunk))
+                db.session.commit()
+                break
+            except IntegrityError:
+                # Another tablet synced some of these ids first; retry to pick them up.
+                db.session.rollback()
+                if attempt == 2:
+                    raise
+        db.session.expunge_all()
+
+    mapping = [
+        {"clientId": cid, "id": oid, "status": status}
+        for cid, (oid, status) in results.items()
+    ]
+    created = sum(1 for item in mapping if item["status"] == "created")
+    return jsonify(
+        {
+            "results": mapping,
+            "errors": errors,
+            "created": created,
+            "duplicates": sum(1 for item in mapping if item["status"] == "duplicate"),
+        }
+    )
+
+
 @orders_bp.post("/orders/<int:order_id>/payments")
+@idempotent
 def add_payment(order_id: int):
-    order = Order.query.get_or_404(order_id)
+    # Row lock serialises concurrent split-bill payments on the same order.
+    order = Order.query.filter_by(id=order_id).with_for_update().first_or_404()
     data = request.get_json(force=True) or {}
-
-    ref_data = data.get("ref")
-    if data.get("method") == "qr" and data.get("transferSlips"):
-        slip_payload = [
-            {
-                "name": slip.get("name"),
-                "slipUrl": slip.get("slipUrl"),
-                "uploadTime": slip.get("uploadTime"),
-                "size": slip.get("size"),
-            }
-            for slip in data["transferSlips"]
-        ]
-        ref_data = json.dumps({"slips": slip_payload})
+    was_paid = bool(order.paid)
 
     payment = Payment(
         order_id=order_id,
@@ -154,66 +582,69 @@ def add_payment(order_id: int):
         amount=data["amount"],
         received=data.get("received", data["amount"]),
         change=data.get("change", 0),
-        ref=ref_data,
+        ref=data.get("ref"),
+        qr_image_url=data.get("qrImageUrl"),
     )
     db.session.add(payment)
     db.session.flush()
 
+    slip_ids = []
     for slip_data in data.get("transferSlips", []):
-        slip_id = slip_data.get("slipId")
-        if not slip_id:
-            continue
-        slip = TransferSlip.query.get(slip_id)
-        if slip:
-            slip.payment_id = payment.id
-            slip.order_id = order_id
+        if slip_data.get("slipId"):
+            slip_ids.append(slip_data["slipId"])
+        elif slip_data.get("slipUrl"):
+            db.session.add(referenced_slip(order_id, payment.id, slip_data))
+    if slip_ids:
+        TransferSlip.query.filter(TransferSlip.id.in_(slip_ids)).update(
+            {"payment_id": payment.id, "order_id": order_id},
+            synchronize_session=False,
+        )
 
-    pays_from_table = Payment.query.filter_by(order_id=order_id).all()
-    total_from_table = sum(float(entry.amount) for entry in pays_from_table)
+    total_from_table = float(
+        db.session.query(func.coalesce(func.sum(Payment.amount), 0))
+        .filter(Payment.order_id == order_id)
+        .scalar()
+    )
     total_from_json = sum(float(entry.get("amount", 0)) for entry in (order.payments or []))
     total_paid = max(total_from_table, total_from_json)
 
     if total_paid + 1e-6 >= float(order.total or 0):
         order.paid = True
         order.paid_at = datetime.utcnow()
+        if not was_paid:
+            record_paid_order(order)
 
     db.session.commit()
     return jsonify({"ok": True, "paymentId": payment.id})
 
 
-@orders_bp.get("/orders/<int:order_id>/slips")
-def list_slips(order_id: int):
-    slips = TransferSlip.query.filter_by(order_id=order_id).all()
-    slip_list = [
-        {
-            "id": slip.id,
-            "filename": slip.filename,
-            "fileSize": slip.file_size,
-            "mimeType": slip.mime_type,
-            "uploadTime": slip.upload_time.isoformat() if slip.upload_time else None,
-            "url": f"/api/slips/{Path(slip.file_path).name}",
-        }
-        for slip in slips
-    ]
+def _slip_file_name(slip: TransferSlip | TransferSlipArchive) -> str:
+    """Name ``serve_slip`` knows a stored slip by."""
+    if blob_store().owns(slip.file_path):
+        return slip.filename
+    return Path(slip.file_path).name
 
-    payments = Payment.query.filter_by(order_id=order_id).all()
-    for payment in payments:
-        if not payment.ref:
-            continue
-        try:
-            ref_data = json.loads(payment.ref)
-        except (json.JSONDecodeError, TypeError):
-            ref_data = None
-        if isinstance(ref_data, dict) and "slips" in ref_data:
-            for slip in ref_data["slips"]:
-                slip_list.append(
-                    {
-                        "paymentId": payment.id,
-                        "filename": slip.get("name"),
-                        "fileSize": slip.get("size"),
-                        "uploadTime": slip.get("uploadTime"),
-                        "url": slip.get("slipUrl"),
-                    }
-                )
 
-    return jsonify(slip_list)
+@orders_bp.get("/orders/<int:order_id>/slips")
+def list_slips(order_id: int):
+    slips = TransferSlip.query.filter_by(order_id=order_id).order_by(TransferSlip.id.asc()).all()
+    if not slips:
+        slips = (
+            TransferSlipArchive.query.filter_by(order_id=order_id)
+            .order_by(TransferSlipArchive.id.asc())
+            .all()
+        )
+    return jsonify(
+        [
+            {
+                "id": slip.id,
+                "paymentId": slip.payment_id,
+                "filename": slip.filename,
+                "fileSize": slip.file_size,
+                "mimeType": slip.mime_type,
+                "uploadTime": slip.upload_time.isoformat() if slip.upload_time else None,
+                "url": slip.slip_url or f"/api/slips/{_slip_file_name(slip)}",
+            }
+            for slip in slips
+        ]
+    )
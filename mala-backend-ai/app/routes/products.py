@@ -1,22 +1,131 @@
+from decimal import Decimal
 from pathlib import Path
 from urllib.parse import urlparse
 
 from flask import Blueprint, current_app, jsonify, request
-
+from sqlalchemy import and_, or_, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from app.blob_store import PRODUCT_IMAGES, discard_blob, release_upload
+from app.catalog import (
+    COLOR_PRICES,
+    PRODUCTS,
+    bump_catalog_version,
+    catalog_response,
+    color_prices_entry,
+    products_entry,
+)
 from app.database import db
 from app.models import ColorPrice, Product
+from app.product_import import parse_csv, resolve_rows, upsert_products, validate_rows
 from flask import request
 
-from app.utils import normalize_product_image, serialize_product
+from app.utils import decode_cursor, encode_cursor, normalize_product_image, serialize_product
 
 
 products_bp = Blueprint("products", __name__, url_prefix="/api")
 
 
+_PRODUCT_SORTS = {"id": Product.id, "name": Product.name, "price": Product.price}
+_SEARCH_ARGS = ("q", "prefix", "category", "active", "color", "sort", "limit", "cursor")
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _name_contains(term: str):
+    """``name`` contains ``term``; on MySQL the ngram FULLTEXT index narrows it first.
+
+    The MATCH only agrees with the LIKE when the index was built with
+    ``innodb_ft_enable_stopword = 0`` (see mala_mysql_upgrades.sql);
+    ``PRODUCTS_FULLTEXT = False`` falls back to the LIKE alone.
+    """
+    contains = Product.name.like(f"%{_like_escape(term)}%", escape="\\")
+    phrase = term.replace('"', " ").strip()
+    if (
+        not current_app.config.get("PRODUCTS_FULLTEXT", True)
+        or db.session.get_bind().dialect.name != "mysql"
+        or len(phrase) < 2
+    ):
+        return contains
+    match = text("MATCH (products.name) AGAINST (:phrase IN BOOLEAN MODE)").bindparams(phrase=f'"{phrase}"')
+    return and_(match, contains)
+
+
+def _search_products(args):
+    """Filtered, sorted keyset page of products as ``{"products", "nextCursor"}``."""
+    query = Product.query
+    if args.get("category"):
+        query = query.filter(Product.category == args["category"])
+    if "active" in args:
+        if args["active"] not in ("0", "1"):
+            return jsonify({"error": "active must be 0 or 1"}), 400
+        query = query.filter(Product.active == (args["active"] == "1"))
+    if args.get("color"):
+        query = query.filter(Product.color == args["color"])
+    if args.get("prefix"):
+        query = query.filter(Product.name.like(f"{_like_escape(args['prefix'])}%", escape="\\"))
+    if args.get("q"):
+        query = query.filter(_name_contains(args["q"].strip()))
+
+    sort = args.get("sort", "-id")
+    descending = sort.startswith("-")
+    column = _PRODUCT_SORTS.get(sort.lstrip("-"))
+    if column is None:
+        return jsonify({"error": "sort must be id, name or price (prefix - for descending)"}), 400
+
+    cfg = current_app.config
+    try:
+        limit = int(args.get("limit", cfg.get("PRODUCTS_PAGE_SIZE", 50)))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, int(cfg.get("PRODUCTS_PAGE_MAX", 200))))
+
+    if args.get("cursor"):
+        try:
+            value, last_id = decode_cursor(args["cursor"])
+            last_id = int(last_id)
+            if column is Product.price:
+                value = Decimal(str(value))
+            elif column is Product.id:
+                value = int(value)
+        except (TypeError, ValueError, ArithmeticError):
+            return jsonify({"error": "invalid cursor"}), 400
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, Product.id < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, Product.id > last_id)))
+
+    order = (column.desc(), Product.id.desc()) if descending else (column.asc(), Product.id.asc())
+    products = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        last = products[-1]
+        value = getattr(last, column.key)
+        next_cursor = encode_cursor(str(value) if column is Product.price else value, last.id)
+
+    return jsonify(
+        {
+            "products": [serialize_product(p) for p in products],
+            "nextCursor": next_cursor,
+        }
+    )
+
+
 @products_bp.get("/products")
 def list_products():
-    products = Product.query.order_by(Product.id.desc()).all()
-    return jsonify([serialize_product(p) for p in products])
+    """All products (cached, ETag) or, with any search argument, a filtered page.
+
+    Search args: ``category``, ``active`` (0/1), ``color``, ``prefix`` (name
+    starts with), ``q`` (name contains), ``sort`` (``id``/``name``/``price``,
+    ``-`` prefix for descending; default ``-id``), ``limit`` and ``cursor``.
+    """
+    if not any(arg in request.args for arg in _SEARCH_ARGS):
+        return catalog_response(products_entry())
+    return _search_products(request.args)
 
 
 @products_bp.post("/products")
@@ -45,10 +154,46 @@ def create_product():
     )
 
     db.session.add(product)
+    bump_catalog_version(PRODUCTS)
     db.session.commit()
     return jsonify(serialize_product(product)), 201
 
 
+@products_bp.post("/products/import")
+def import_products():
+    """Create or update many products in one transaction, matched by name.
+
+    Body: a JSON array (or ``{"products": [...]}``), a ``text/csv`` body, or
+    a multipart ``file`` upload with a header row. Fields: name, price,
+    category, stock, active, color, image; omitted fields keep their current
+    value. Nothing is written if any row fails validation.
+    """
+    upload = request.files.get("file")
+    if upload is not None or request.mimetype == "text/csv":
+        try:
+            rows = parse_csv(upload.read() if upload is not None else request.get_data())
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+    else:
+        rows = request.get_json(force=True, silent=True)
+        if isinstance(rows, dict):
+            rows = rows.get("products")
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"error": "expected a non-empty JSON array or CSV"}), 400
+
+    cleaned, errors = validate_rows(rows, request.host)
+    values, created, resolve_errors = resolve_rows(cleaned)
+    errors.extend(resolve_errors)
+    if errors:
+        errors.sort(key=lambda error: error["row"])
+        return jsonify({"created": 0, "updated": 0, "errors": errors}), 400
+
+    upsert_products(values, int(current_app.config.get("PRODUCTS_IMPORT_BATCH", 500)))
+    bump_catalog_version(PRODUCTS)
+    db.session.commit()
+    return jsonify({"created": created, "updated": len(values) - created, "errors": []})
+
+
 @products_bp.put("/products/<int:product_id>")
 def update_product(product_id: int):
     product = Product.query.get_or_404(product_id)
@@ -69,6 +214,7 @@ def update_product(product_id: int):
     if "image" in data:
         product.image = normalize_product_image(data.get("image"), request.host)
 
+    bump_catalog_version(PRODUCTS)
     db.session.commit()
     return jsonify(serialize_product(product))
 
@@ -77,7 +223,13 @@ def update_product(product_id: int):
 def delete_product(product_id: int):
     product = Product.query.get_or_404(product_id)
 
-    if product.image:
+    released_blob = None
+    # Re-uploads of the same photo share one name, so keep it while any other
+    # product still shows it.
+    image_shared = bool(product.image) and (
+        Product.query.filter(Product.image == product.image, Product.id != product.id).first() is not None
+    )
+    if product.image and not image_shared:
         filename = ""
         image_value = product.image
         if not image_value.startswith(("http://", "https://")):
@@ -88,6 +240,7 @@ def delete_product(product_id: int):
                 filename = parsed.path.rsplit("/", 1)[-1]
 
         if filename:
+            released_blob = release_upload(PRODUCT_IMAGES, filename)
             image_path = Path(current_app.config["PRODUCTS_UPLOAD_DIR"]) / filename
             if image_path.exists():
                 try:
@@ -98,26 +251,23 @@ def delete_product(product_id: int):
 
     product_name = product.name
     db.session.delete(product)
+    bump_catalog_version(PRODUCTS)
     db.session.commit()
+    if released_blob is not None:
+        discard_blob(released_blob)
     return jsonify({"success": True, "message": f"ลบสินค้า '{product_name}' สำเร็จ"})
 
 
 @products_bp.get("/color-prices")
 def get_color_prices():
-    rows = ColorPrice.query.order_by(ColorPrice.color.asc()).all()
-    return jsonify({
-        row.color: {
-            "price": float(row.price),
-            "stock": int(row.stock or 0)
-        }
-        for row in rows
-    })
+    return catalog_response(color_prices_entry())
 
 
 @products_bp.put("/color-prices")
 def update_color_prices():
+    """Apply ``{color: price | {"price", "stock"}}`` in one multi-row upsert."""
     data = request.get_json(force=True) or {}
-    updated = {}
+    changes = {}
     for color, payload in data.items():
         price = None
         stock = None
@@ -138,24 +288,32 @@ def update_color_prices():
         except (TypeError, ValueError):
             stock = None
 
-        row = ColorPrice.query.get(color)
-        if not row:
-            row = ColorPrice(
-                color=color,
-                price=price or 0,
-                stock=stock if stock is not None else 0,
-            )
-            db.session.add(row)
-        else:
-            if price is not None:
-                row.price = price
-            if stock is not None:
-                row.stock = stock
-
-        updated[color] = {
-            "price": float(row.price),
-            "stock": int(row.stock or 0)
-        }
+        changes[color] = (price, stock)
+
+    if not changes:
+        return jsonify({})
 
+    # Locked so fields the payload leaves out can't be overwritten with stale values.
+    existing = {
+        row.color: row
+        for row in ColorPrice.query.filter(ColorPrice.color.in_(list(changes))).with_for_update().all()
+    }
+    values = []
+    updated = {}
+    for color, (price, stock) in changes.items():
+        row = existing.get(color)
+        if row is None:
+            price = price or 0
+            stock = stock if stock is not None else 0
+        else:
+            price = price if price is not None else float(row.price)
+            stock = stock if stock is not None else int(row.stock or 0)
+        values.append({"color": color, "price": price, "stock": stock})
+        updated[color] = {"price": float(price), "stock": int(stock)}
+
+    stmt = mysql_insert(ColorPrice.__table__).values(values)
+    stmt = stmt.on_duplicate_key_update(price=stmt.inserted.price, stock=stmt.inserted.stock)
+    db.session.execute(stmt)
+    bump_catalog_version(COLOR_PRICES)
     db.session.commit()
     return jsonify(updated)
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from flask import Blueprint, jsonify, request
+from sqlalchemy import func
+
+from app.archive import includes_archive
+from app.database import db
+from app.models import (
+    Order,
+    OrderArchive,
+    OrderItem,
+    OrderItemArchive,
+    SalesRollupDaily,
+    SalesRollupHourly,
+)
+from app.utils import parse_datetime_arg
+
+
+reports_bp = Blueprint("reports", __name__, url_prefix="/api/reports")
+
+
+def _rollup_filters():
+    """Resolve ``granularity``/``from``/``to`` into a rollup model and filters."""
+    granularity = request.args.get("granularity", "day")
+    if granularity not in ("day", "hour"):
+        raise ValueError("granularity must be day or hour")
+    model = SalesRollupDaily if granularity == "day" else SalesRollupHourly
+    try:
+        start = parse_datetime_arg(request.args.get("from"))
+        end = parse_datetime_arg(request.args.get("to"), end=True)
+    except ValueError as exc:
+        raise ValueError("invalid from/to date") from exc
+
+    filters = []
+    if start:
+        filters.append(model.bucket >= start)
+    if end:
+        filters.append(model.bucket < end)
+    return model, filters
+
+
+def _breakdown(dimension: str):
+    try:
+        model, filters = _rollup_filters()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    rows = (
+        db.session.query(
+            model.dim_key,
+            func.sum(model.orders),
+            func.sum(model.quantity),
+            func.sum(model.amount),
+        )
+        .filter(model.dimension == dimension, *filters)
+        .group_by(model.dim_key)
+        .order_by(func.sum(model.amount).desc())
+        .all()
+    )
+    return jsonify(
+        [
+            {
+                "key": key,
+                "orders": int(orders or 0),
+                "quantity": float(quantity or 0),
+                "amount": float(amount or 0),
+            }
+            for key, orders, quantity, amount in rows
+        ]
+    )
+
+
+@reports_bp.get("/summary")
+def summary():
+    try:
+        model, filters = _rollup_filters()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    rows = (
+        model.query.filter(model.dimension == "total", *filters)
+        .order_by(model.bucket.asc())
+        .all()
+    )
+    buckets = [
+        {
+            "bucket": row.bucket.isoformat(),
+            "orders": int(row.orders),
+            "quantity": float(row.quantity),
+            "amount": float(row.amount),
+        }
+        for row in rows
+    ]
+    return jsonify(
+        {
+            "buckets": buckets,
+            "totals": {
+                "orders": sum(b["orders"] for b in buckets),
+                "quantity": sum(b["quantity"] for b in buckets),
+                "amount": round(sum(b["amount"] for b in buckets), 2),
+            },
+        }
+    )
+
+
+@reports_bp.get("/channels")
+def by_channel():
+    return _breakdown("channel")
+
+
+@reports_bp.get("/payment-methods")
+def by_payment_method():
+    return _breakdown("method")
+
+
+@reports_bp.get("/items")
+def by_item():
+    return _breakdown("item")
+
+
+@reports_bp.get("/item-sales")
+def item_sales():
+    """Ad-hoc item aggregates over ``order_items`` (paid orders only).
+
+    ``groupBy`` is ``item`` (default), ``color`` or ``product``; ``color`` and
+    ``productId`` narrow the rows, ``from``/``to`` bound ``created_at``.
+    Archived line items are included when ``from`` reaches back that far.
+    """
+    group_by = request.args.get("groupBy", "item")
+    column = {"item": "item_key", "color": "color", "product": "product_id"}.get(group_by)
+    if column is None:
+        return jsonify({"error": "groupBy must be item, color or product"}), 400
+
+    try:
+        start = parse_datetime_arg(request.args.get("from"))
+        end = parse_datetime_arg(request.args.get("to"), end=True)
+    except ValueError:
+        return jsonify({"error": "invalid from/to date"}), 400
+    product_id = request.args.get("productId")
+    if product_id:
+        try:
+            product_id = int(product_id)
+        except ValueError:
+            return jsonify({"error": "productId must be an integer"}), 400
+
+    sources = [(OrderItem, Order)]
+    if includes_archive(start, end):
+        sources.append((OrderItemArchive, OrderArchive))
+
+    totals: dict = {}
+    for item_model, order_model in sources:
+        key_column = getattr(item_model, column)
+        query = (
+            db.session.query(
+                key_column,
+                func.max(item_model.name),
+                func.count(func.distinct(item_model.order_id)),
+                func.sum(item_model.qty),
+                func.sum(item_model.amount),
+            )
+            .join(order_model, order_model.id == item_model.order_id)
+            .filter(order_model.paid == True)  # noqa: E712
+        )
+        if group_by == "product":
+            query = query.filter(key_column.isnot(None))
+        if start:
+            query = query.filter(item_model.created_at >= start)
+        if end:
+            query = query.filter(item_model.created_at < end)
+        if request.args.get("color"):
+            query = query.filter(item_model.color == request.args["color"].lower())
+        if product_id:
+            query = query.filter(item_model.product_id == product_id)
+
+        for key, name, orders, quantity, amount in query.group_by(key_column).all():
+            slot = totals.setdefault(key, {"key": key, "name": name, "orders": 0, "quantity": 0, "amount": 0.0})
+            slot["name"] = slot["name"] or name
+            slot["orders"] += int(orders or 0)
+            slot["quantity"] += int(quantity or 0)
+            slot["amount"] += float(amount or 0)
+
+    return jsonify(sorted(totals.values(), key=lambda row: row["amount"], reverse=True))
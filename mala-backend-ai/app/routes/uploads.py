@@ -1,14 +1,15 @@
 from __future__ import annotations
 
-import json
 import uuid
 from datetime import datetime
-from pathlib import Path
 
-from flask import Blueprint, current_app, jsonify, request, send_from_directory
+from flask import Blueprint, current_app, jsonify, request
 from werkzeug.utils import secure_filename
 
 from app.database import db
+from app.blob_store import PRODUCT_IMAGES, QR_IMAGES, SLIPS, resolve_upload, store_upload
+from app.file_serving import send_upload
+from app.image_variants import pick_format, pick_width, pregenerate, variant_file, variant_mimetype
 from app.models import Payment, TransferSlip
 from app.utils import abs_url_for, allowed_file, get_file_type
 
@@ -47,12 +48,12 @@ def upload_product_image():
     file, size, _ = result
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    ext = file.filename.rsplit(".", 1)[1].lower()
     filename = f"product_{timestamp}_{secure_filename(file.filename)}"
 
-    target_dir = Path(current_app.config["PRODUCTS_UPLOAD_DIR"])
-    file_path = target_dir / filename
-    file.save(file_path)
+    filename, file_path, duplicate = store_upload(PRODUCT_IMAGES, file, filename, reuse=True)
+    db.session.commit()
+    if not duplicate:
+        pregenerate(file_path, filename)
 
     relative_url = f"/api/products/images/{filename}"
     absolute_url = abs_url_for("uploads.serve_product_image", filename=filename)
@@ -65,17 +66,26 @@ def upload_product_image():
             "relativeUrl": relative_url,
             "filename": filename,
             "size": size,
+            "duplicate": duplicate,
         }
     )
 
 
 @uploads_bp.get("/api/products/images/<path:filename>")
 def serve_product_image(filename: str):
-    try:
-        return send_from_directory(str(current_app.config["PRODUCTS_UPLOAD_DIR"]), filename)
-    except Exception as exc:
-        print(f"❌ Error serving product image: {exc}")
+    """Serve a product image; ``?w=<px>`` picks a resized WebP/JPEG derivative."""
+    path = resolve_upload(PRODUCT_IMAGES, current_app.config["PRODUCTS_UPLOAD_DIR"], filename)
+    if path is None:
         return jsonify({"error": "ไม่พบไฟล์รูปภาพ"}), 404
+    width = request.args.get("w", type=int)
+    if width and width > 0:
+        fmt = pick_format()
+        variant = variant_file(path, filename, pick_width(width), fmt)
+        if variant is not None:
+            response = send_upload(variant, mimetype=variant_mimetype(fmt))
+            response.vary.add("Accept")
+            return response
+    return send_upload(path, mimetype=get_file_type(filename))
 
 
 @uploads_bp.get("/uploads/products/<path:filename>")
@@ -93,9 +103,8 @@ def upload_qr_code():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"qr_{timestamp}_{secure_filename(file.filename)}"
 
-    target_dir = Path(current_app.config["QR_UPLOAD_DIR"])
-    file_path = target_dir / filename
-    file.save(file_path)
+    filename, _, duplicate = store_upload(QR_IMAGES, file, filename, reuse=True)
+    db.session.commit()
 
     relative_url = f"/api/qr/images/{filename}"
     absolute_url = abs_url_for("uploads.serve_qr_image", filename=filename)
@@ -108,17 +117,17 @@ def upload_qr_code():
             "relativeUrl": relative_url,
             "filename": filename,
             "size": size,
+            "duplicate": duplicate,
         }
     )
 
 
 @uploads_bp.get("/api/qr/images/<path:filename>")
 def serve_qr_image(filename: str):
-    try:
-        return send_from_directory(str(current_app.config["QR_UPLOAD_DIR"]), filename)
-    except Exception as exc:
-        print(f"❌ Error serving QR image: {exc}")
+    path = resolve_upload(QR_IMAGES, current_app.config["QR_UPLOAD_DIR"], filename)
+    if path is None:
         return jsonify({"error": "ไม่พบไฟล์ QR Code"}), 404
+    return send_upload(path, mimetype=get_file_type(filename))
 
 
 @uploads_bp.post("/api/upload-slip")
@@ -139,9 +148,9 @@ def upload_slip():
     ext = file.filename.rsplit(".", 1)[1].lower()
     filename = f"slip_{order_id}_{timestamp}_{uuid.uuid4().hex[:8]}.{ext}"
 
-    target_dir = Path(current_app.config["UPLOAD_FOLDER"])
-    file_path = target_dir / filename
-    file.save(file_path)
+    # Every slip keeps its own name (it encodes the order); identical bytes
+    # still share one blob.
+    filename, file_path, _ = store_upload(SLIPS, file, filename)
 
     payment = None
     if payment_id:
@@ -163,20 +172,6 @@ def upload_slip():
 
     slip_url = abs_url_for("uploads.serve_slip", filename=filename)
 
-    if payment:
-        ref_payload = {"slipUrl": slip_url, "slipId": slip.id}
-        try:
-            existing_ref = json.loads(payment.ref) if payment.ref else {}
-        except json.JSONDecodeError:
-            existing_ref = {}
-
-        if isinstance(existing_ref, dict):
-            existing_ref.update(ref_payload)
-            payment.ref = json.dumps(existing_ref)
-        else:
-            payment.ref = json.dumps(ref_payload)
-        db.session.commit()
-
     return jsonify(
         {
             "success": True,
@@ -189,7 +184,7 @@ def upload_slip():
 
 @uploads_bp.get("/api/slips/<path:filename>")
 def serve_slip(filename: str):
-    try:
-        return send_from_directory(str(current_app.config["UPLOAD_FOLDER"]), filename)
-    except FileNotFoundError:
+    path = resolve_upload(SLIPS, current_app.config["UPLOAD_FOLDER"], filename)
+    if path is None:
         return jsonify({"error": "ไม่พบไฟล์"}), 404
+    return send_upload(path, mimetype=get_file_type(filename), private=True)
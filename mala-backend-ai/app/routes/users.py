@@ -1,5 +1,4 @@
 from flask import Blueprint, jsonify, request
-from sqlalchemy import func
 
 from app.auth import make_password_hash
 from app.database import db
@@ -46,7 +45,7 @@ def create_user():
     if not username:
         return jsonify({"error": "ชื่อผู้ใช้ห้ามว่าง"}), 400
 
-    existing = User.query.filter(func.lower(User.username) == username.lower()).first()
+    existing = User.query.filter(User.username_lower == username.lower()).first()
     if existing:
         return jsonify({"error": "ชื่อผู้ใช้นี้มีอยู่แล้ว"}), 400
 
@@ -81,7 +80,7 @@ def update_user(user_id: int):
         if not username:
             return jsonify({"error": "ชื่อผู้ใช้ห้ามว่าง"}), 400
         duplicate = (
-            User.query.filter(func.lower(User.username) == username.lower(), User.id != user_id)
+            User.query.filter(User.username_lower == username.lower(), User.id != user_id)
             .first()
         )
         if duplicate:
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from flask import current_app
+
+
+class SlipFileIndex:
+    """In-memory set of slip filenames present under ``UPLOAD_FOLDER``.
+
+    Listing endpoints check membership instead of stat-ing each file. The set
+    is built at startup, updated by uploads, and rescanned in a background
+    thread once it is older than ``ttl`` seconds (the stale set keeps serving
+    until the rescan finishes).
+    """
+
+    def __init__(self, root: Path, ttl: float = 300.0):
+        self.root = Path(root)
+        self.ttl = ttl
+        self._names: set[str] = set()
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # Changes made while a rescan is running, replayed onto its result.
+        self._pending: dict[str, bool] = {}
+
+    def _scan(self) -> set[str]:
+        try:
+            with os.scandir(self.root) as entries:
+                return {entry.name for entry in entries if entry.is_file()}
+        except FileNotFoundError:
+            return set()
+
+    def rebuild(self) -> None:
+        with self._lock:
+            self._refreshing = True
+            self._pending = {}
+        names = self._scan()
+        with self._lock:
+            for name, present in self._pending.items():
+                if present:
+                    names.add(name)
+                else:
+                    names.discard(name)
+            self._names = names
+            self._pending = {}
+            self._built_at = time.monotonic()
+            self._refreshing = False
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            # Claim the refresh so concurrent readers don't start another one.
+            self._built_at = time.monotonic()
+        threading.Thread(target=self.rebuild, name="slip-index", daemon=True).start()
+
+    def __contains__(self, filename: str) -> bool:
+        if self.ttl > 0 and time.monotonic() - self._built_at > self.ttl:
+            self._refresh_in_background()
+        return filename in self._names
+
+    def add(self, filename: str) -> None:
+        with self._lock:
+            self._names.add(filename)
+            if self._refreshing:
+                self._pending[filename] = True
+
+    def discard(self, filename: str) -> None:
+        with self._lock:
+            self._names.discard(filename)
+            if self._refreshing:
+                self._pending[filename] = False
+
+
+def init_slip_index(app) -> None:
+    index = SlipFileIndex(
+        app.config["UPLOAD_FOLDER"],
+        ttl=float(app.config.get("SLIP_INDEX_TTL", 300)),
+    )
+    index.rebuild()
+    app.extensions["slip_index"] = index
+
+
+def slip_index() -> SlipFileIndex:
+    return current_app.extensions["slip_index"]
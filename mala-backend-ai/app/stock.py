@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Iterable
+
+from sqlalchemy import case, update
+
+from app.catalog import COLOR_PRICES, PRODUCTS
+from app.database import db
+from app.models import ColorPrice, Order, Product
+from app.order_items import order_item_rows
+
+
+class StockDemand:
+    """Quantities an order batch takes from ``products`` and ``color_prices``."""
+
+    def __init__(self, orders: Iterable[Order]):
+        self.products: Counter = Counter()
+        self.colors: Counter = Counter()
+        for order in orders:
+            for row in order_item_rows(order):
+                if row["qty"] <= 0:
+                    continue
+                if row["product_id"] is not None:
+                    self.products[row["product_id"]] += row["qty"]
+                elif row["color"]:
+                    self.colors[row["color"]] += row["qty"]
+
+    def __bool__(self) -> bool:
+        return bool(self.products or self.colors)
+
+    def sections(self) -> list[str]:
+        """Catalog sections whose cached payloads show stock this demand changes.
+
+        Bump them in the order's transaction so every worker's cached product
+        list and colour prices pick up the new stock.
+        """
+        return [name for name, counts in ((PRODUCTS, self.products), (COLOR_PRICES, self.colors)) if counts]
+
+
+def _decrement(model, key, demand: Counter, strict: bool) -> bool:
+    qty = case(dict(demand), value=key)
+    stmt = update(model).where(key.in_(list(demand))).values(stock=model.stock - qty)
+    if strict:
+        stmt = stmt.where(model.stock >= qty)
+    result = db.session.execute(stmt.execution_options(synchronize_session=False))
+    if not strict or result.rowcount == len(demand):
+        return True
+    # Rare path: tell short rows apart from ids that simply don't exist.
+    existing = db.session.query(model).filter(key.in_(list(demand))).count()
+    return result.rowcount == existing
+
+
+def decrement_stock(demand: StockDemand, strict: bool = False) -> bool:
+    """Take ``demand`` off stock with one conditional UPDATE per table.
+
+    Runs in the caller's transaction; the row locks taken by the UPDATE keep
+    concurrent orders from overselling. With ``strict`` rows that would go
+    negative are left alone and ``False`` is returned so the caller can roll
+    back. Otherwise stock may go negative and the result is always ``True``.
+    Unknown product ids and colours are ignored.
+    """
+    ok = True
+    if demand.products:
+        ok = _decrement(Product, Product.id, demand.products, strict) and ok
+    if demand.colors:
+        ok = _decrement(ColorPrice, ColorPrice.color, demand.colors, strict) and ok
+    return ok
+
+
+def stock_shortages(demand: StockDemand) -> list[dict]:
+    """Lines of ``demand`` that current stock can't cover (call after rolling back)."""
+    shortages = []
+    if demand.products:
+        for product_id, stock in db.session.query(Product.id, Product.stock).filter(
+            Product.id.in_(list(demand.products))
+        ):
+            if stock < demand.products[product_id]:
+                shortages.append(
+                    {"productId": product_id, "requested": demand.products[product_id], "available": stock}
+                )
+    if demand.colors:
+        for color, stock in db.session.query(ColorPrice.color, ColorPrice.stock).filter(
+            ColorPrice.color.in_(list(demand.colors))
+        ):
+            if stock < demand.colors[color]:
+                shortages.append({"color": color, "requested": demand.colors[color], "available": stock})
+    return shortages
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import base64
+import hashlib
+import json
 import mimetypes
 import os
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Iterable
 from urllib.parse import urlparse
 
 from flask import current_app, has_request_context, request, url_for
+from werkzeug.routing import Map, PathConverter
 from werkzeug.utils import secure_filename
 
 
@@ -30,12 +36,98 @@ def get_file_type(filename: str) -> str:
     return mime_type or "application/octet-stream"
 
 
+def encode_cursor(*values) -> str:
+    """Pack keyset pagination values into an opaque URL-safe token."""
+    parts = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(parts, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> list:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` on malformed tokens."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(values, list):
+        raise ValueError("invalid cursor")
+    return values
+
+
+def parse_datetime_arg(value: str | None, end: bool = False) -> datetime | None:
+    """Parse a ``YYYY-MM-DD`` or ISO datetime query argument.
+
+    With ``end=True`` a bare date means "through the end of that day", so the
+    result is the next midnight and callers should compare with ``<``.
+    Raises ``ValueError`` for unparseable input.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def referenced_slip(order_id: int, payment_id: int, slip_data: dict):
+    """Build a TransferSlip for a slip sent only as a URL (nothing stored on our disk)."""
+    from app.models import TransferSlip
+
+    slip_url = slip_data["slipUrl"]
+    name = slip_data.get("name") or slip_url.rsplit("/", 1)[-1]
+    try:
+        upload_time = datetime.fromisoformat(str(slip_data.get("uploadTime")).replace("Z", "+00:00"))
+        if upload_time.tzinfo is not None:
+            upload_time = upload_time.astimezone(timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        upload_time = datetime.utcnow()
+    try:
+        size = int(slip_data.get("size") or 0)
+    except (TypeError, ValueError):
+        size = 0
+    return TransferSlip(
+        order_id=order_id,
+        payment_id=payment_id,
+        filename=name,
+        file_path="",
+        file_size=size,
+        mime_type=get_file_type(name),
+        upload_time=upload_time,
+        slip_url=slip_url,
+    )
+
+
 def abs_url_for(endpoint: str, **values) -> str:
     rel = url_for(endpoint, **values)
     host = request.host_url.rstrip("/")
     return f"{host}{rel}"
 
 
+_FILENAME_PLACEHOLDER = "__filename__"
+# Same quoting url_for applies to ``<path:filename>`` segments; filenames
+# repeat across requests, so the quoted form is memoized too.
+_path_to_url = lru_cache(maxsize=4096)(PathConverter(Map()).to_url)
+
+
+@lru_cache(maxsize=64)
+def _file_url_template(endpoint: str, host_url: str, script_root: str) -> tuple[str, str]:
+    absolute = abs_url_for(endpoint, filename=_FILENAME_PLACEHOLDER)
+    prefix, _, suffix = absolute.partition(_FILENAME_PLACEHOLDER)
+    return prefix, suffix
+
+
+def file_url(endpoint: str, filename: str) -> str:
+    """``abs_url_for(endpoint, filename=filename)`` built by concatenation.
+
+    The URL around the filename is resolved once per host, so serializing long
+    lists doesn't pay for ``url_for`` on every row. Needs a request context.
+    """
+    prefix, suffix = _file_url_template(endpoint, request.host_url, request.script_root)
+    return f"{prefix}{_path_to_url(filename)}{suffix}"
+
+
 def _strip_fragment_and_query(path: str) -> str:
     without_query = path.split("?", 1)[0]
     return without_query.split("#", 1)[0]
@@ -132,7 +224,7 @@ def build_product_image_info(image_value: str | None) -> dict[str, str]:
     absolute = relative
     if has_request_context():
         try:
-            absolute = abs_url_for("uploads.serve_product_image", filename=filename)
+            absolute = file_url("uploads.serve_product_image", filename)
         except RuntimeError:
             absolute = relative
 
@@ -151,13 +243,22 @@ def build_qr_image_info(image_value: str | None) -> dict[str, str]:
     absolute = relative
     if has_request_context():
         try:
-            absolute = abs_url_for("uploads.serve_qr_image", filename=filename)
+            absolute = file_url("uploads.serve_qr_image", filename)
         except RuntimeError:
             absolute = relative
 
     return {"path": filename, "relative": relative, "absolute": absolute}
 
 
+def _model_version(model_path: str) -> str:
+    """Identify the loaded weights by file name and content hash."""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f"{Path(model_path).name}@{digest.hexdigest()[:12]}"
+
+
 def init_ai_model(app) -> None:
     ai_state: dict[str, object | None] = {
         "model": None,
@@ -165,6 +266,7 @@ def init_ai_model(app) -> None:
         "np": None,
         "Image": None,
         "ImageOps": None,
+        "model_version": None,
     }
 
     try:
@@ -201,6 +303,7 @@ def init_ai_model(app) -> None:
         try:
             model = YOLO(model_path)
             ai_state["model"] = model
+            ai_state["model_version"] = _model_version(model_path)
             app.config["MODEL_PATH"] = model_path
             print(f"✅ Loaded model: {model_path}")
         except Exception as exc:
@@ -224,6 +327,17 @@ def serialize_user(user) -> dict:
     }
 
 
+def product_image_variants(image_info: dict[str, str]) -> dict[str, str]:
+    """``{width: url}`` for the resized derivatives of a locally stored image."""
+    from app.image_variants import variants_enabled
+
+    path = image_info["path"]
+    if not path or path.startswith(("http://", "https://")) or not variants_enabled():
+        return {}
+    absolute = image_info["absolute"]
+    return {str(width): f"{absolute}?w={width}" for width in current_app.config["IMAGE_VARIANT_WIDTHS"]}
+
+
 def serialize_product(product) -> dict:
     price = product.price or 0
     image_info = build_product_image_info(product.image)
@@ -238,6 +352,7 @@ def serialize_product(product) -> dict:
         "image": image_info["absolute"],
         "imagePath": image_info["path"],
         "imageRelative": image_info["relative"],
+        "imageVariants": product_image_variants(image_info),
     }
 
 
@@ -2,6 +2,10 @@
 -- Charset & engine defaults
 SET NAMES utf8mb4;
 SET FOREIGN_KEY_CHECKS=0;
+-- Build FULLTEXT indexes without the stopword list: the ngram parser drops
+-- every token containing a stopword ("a", "i", ...), so product search would
+-- miss names such as "mala".
+SET SESSION innodb_ft_enable_stopword = 0;
 
 -- Create database (optional; comment out if you already created it)
 CREATE DATABASE IF NOT EXISTS mala_db
@@ -13,13 +17,15 @@ USE mala_db;
 CREATE TABLE IF NOT EXISTS users (
   id BIGINT PRIMARY KEY AUTO_INCREMENT,
   username VARCHAR(255) NOT NULL UNIQUE,
+  username_lower VARCHAR(255) GENERATED ALWAYS AS (LOWER(username)) STORED,
   password TEXT,
   role VARCHAR(100) NOT NULL,
   name TEXT,
   active TINYINT(1) NOT NULL,
   phone TEXT,
   email TEXT,
-  perms JSON
+  perms JSON,
+  INDEX ix_users_username_lower (username_lower)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ===== TABLE: products =====
@@ -31,7 +37,10 @@ CREATE TABLE IF NOT EXISTS products (
   stock INT NOT NULL,
   active TINYINT(1) NOT NULL,
   color VARCHAR(50),
-  image TEXT
+  image TEXT,
+  INDEX ix_products_name (name),
+  INDEX ix_products_category_active (category, active),
+  FULLTEXT INDEX ft_products_name (name) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ===== TABLE: color_prices =====
@@ -41,9 +50,19 @@ CREATE TABLE IF NOT EXISTS color_prices (
   stock INT NOT NULL DEFAULT 0
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- ===== TABLE: catalog_versions =====
+-- Bumped on every product/colour-price change; workers compare it to their cache.
+CREATE TABLE IF NOT EXISTS catalog_versions (
+  name VARCHAR(50) PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+INSERT IGNORE INTO catalog_versions (name, version) VALUES ('products', 0), ('color_prices', 0);
+
 -- ===== TABLE: orders =====
 CREATE TABLE IF NOT EXISTS orders (
   id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  client_id VARCHAR(64) NULL,
+  detection_hash VARCHAR(64) NULL,
   created_at DATETIME NOT NULL,
   items JSON NOT NULL,
   persons INT NOT NULL,
@@ -57,7 +76,32 @@ CREATE TABLE IF NOT EXISTS orders (
   discount DECIMAL(12,2) NOT NULL,
   service DECIMAL(12,2) NOT NULL,
   vat DECIMAL(12,2) NOT NULL,
-  total DECIMAL(12,2) NOT NULL
+  total DECIMAL(12,2) NOT NULL,
+  UNIQUE KEY uq_orders_client_id (client_id),
+  INDEX ix_orders_detection_hash (detection_hash),
+  INDEX ix_orders_created_at (created_at),
+  INDEX ix_orders_paid_created (paid, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ===== TABLE: order_items =====
+CREATE TABLE IF NOT EXISTS order_items (
+  id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  order_id BIGINT NOT NULL,
+  created_at DATETIME NOT NULL,
+  item_key VARCHAR(100) NOT NULL,
+  product_id BIGINT NULL,
+  color VARCHAR(50),
+  name VARCHAR(255),
+  qty INT NOT NULL,
+  price DECIMAL(12,2) NOT NULL,
+  amount DECIMAL(12,2) NOT NULL,
+  INDEX ix_order_items_order_id (order_id),
+  INDEX ix_order_items_created_at (created_at),
+  INDEX ix_order_items_product_created (product_id, created_at),
+  INDEX ix_order_items_color_created (color, created_at),
+  CONSTRAINT fk_order_items_order
+    FOREIGN KEY (order_id) REFERENCES orders(id)
+    ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ===== TABLE: payments =====
@@ -71,6 +115,8 @@ CREATE TABLE IF NOT EXISTS payments (
   `change` DECIMAL(12,2) NOT NULL,
   `time` DATETIME NOT NULL,
   ref TEXT,
+  qr_image_url TEXT,
+  INDEX ix_payments_order_time (order_id, `time`),
   CONSTRAINT fk_payments_order
     FOREIGN KEY (order_id) REFERENCES orders(id)
     ON DELETE CASCADE
@@ -86,6 +132,9 @@ CREATE TABLE IF NOT EXISTS transfer_slips (
   file_size INT NOT NULL,
   mime_type TEXT NOT NULL,
   upload_time DATETIME NOT NULL,
+  slip_url TEXT,
+  INDEX ix_transfer_slips_filename (filename(191)),
+  INDEX ix_transfer_slips_file_path (file_path(255)),
   CONSTRAINT fk_slips_order
     FOREIGN KEY (order_id) REFERENCES orders(id)
     ON DELETE CASCADE,
@@ -96,6 +145,164 @@ CREATE TABLE IF NOT EXISTS transfer_slips (
 
 -- (ไม่ต้อง DROP/CREATE INDEX เพิ่ม เพราะ FK มี index ให้อยู่แล้ว)
 
+-- ===== ARCHIVE TABLES (flask archive run) =====
+-- Same columns and ids as the hot tables; rows are moved here once they are
+-- older than MALA_ARCHIVE_AFTER_DAYS.
+CREATE TABLE IF NOT EXISTS orders_archive (
+  id BIGINT PRIMARY KEY,
+  client_id VARCHAR(64) NULL,
+  detection_hash VARCHAR(64) NULL,
+  created_at DATETIME NOT NULL,
+  items JSON NOT NULL,
+  persons INT NOT NULL,
+  split_mode VARCHAR(50) NOT NULL,
+  payments JSON NOT NULL,
+  paid TINYINT(1) NOT NULL,
+  paid_at DATETIME NULL,
+  channel VARCHAR(50),
+  store JSON,
+  subtotal DECIMAL(12,2) NOT NULL,
+  discount DECIMAL(12,2) NOT NULL,
+  service DECIMAL(12,2) NOT NULL,
+  vat DECIMAL(12,2) NOT NULL,
+  total DECIMAL(12,2) NOT NULL,
+  archived_at DATETIME NOT NULL,
+  UNIQUE KEY uq_orders_archive_client_id (client_id),
+  INDEX ix_orders_archive_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS order_items_archive (
+  id BIGINT PRIMARY KEY,
+  order_id BIGINT NOT NULL,
+  created_at DATETIME NOT NULL,
+  item_key VARCHAR(100) NOT NULL,
+  product_id BIGINT NULL,
+  color VARCHAR(50),
+  name VARCHAR(255),
+  qty INT NOT NULL,
+  price DECIMAL(12,2) NOT NULL,
+  amount DECIMAL(12,2) NOT NULL,
+  INDEX ix_order_items_archive_created_at (created_at),
+  INDEX ix_order_items_archive_product_created (product_id, created_at),
+  INDEX ix_order_items_archive_color_created (color, created_at),
+  CONSTRAINT fk_order_items_archive_order
+    FOREIGN KEY (order_id) REFERENCES orders_archive(id)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS payments_archive (
+  id BIGINT PRIMARY KEY,
+  order_id BIGINT NOT NULL,
+  method VARCHAR(50) NOT NULL,
+  amount DECIMAL(12,2) NOT NULL,
+  received DECIMAL(12,2) NOT NULL,
+  `change` DECIMAL(12,2) NOT NULL,
+  `time` DATETIME NOT NULL,
+  ref TEXT,
+  qr_image_url TEXT,
+  CONSTRAINT fk_payments_archive_order
+    FOREIGN KEY (order_id) REFERENCES orders_archive(id)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS transfer_slips_archive (
+  id BIGINT PRIMARY KEY,
+  order_id BIGINT NOT NULL,
+  payment_id BIGINT NULL,
+  filename TEXT NOT NULL,
+  file_path TEXT NOT NULL,
+  file_size INT NOT NULL,
+  mime_type TEXT NOT NULL,
+  upload_time DATETIME NOT NULL,
+  slip_url TEXT,
+  INDEX ix_transfer_slips_archive_payment_id (payment_id),
+  INDEX ix_transfer_slips_archive_filename (filename(191)),
+  INDEX ix_transfer_slips_archive_file_path (file_path(255)),
+  CONSTRAINT fk_slips_archive_order
+    FOREIGN KEY (order_id) REFERENCES orders_archive(id)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ===== TABLE: detections =====
+CREATE TABLE IF NOT EXISTS detections (
+  id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  image_hash VARCHAR(64) NOT NULL,
+  created_at DATETIME NOT NULL,
+  store VARCHAR(100),
+  profile VARCHAR(50),
+  model_version VARCHAR(255),
+  counts JSON NOT NULL,
+  total_items INT NOT NULL,
+  roi JSON,
+  timings JSON,
+  order_id BIGINT NULL,
+  INDEX ix_detections_image_hash (image_hash),
+  INDEX ix_detections_created_at (created_at),
+  INDEX ix_detections_store (store),
+  INDEX ix_detections_order_id (order_id),
+  CONSTRAINT fk_detections_order
+    FOREIGN KEY (order_id) REFERENCES orders(id)
+    ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ===== TABLE: sales_rollups_hourly =====
+CREATE TABLE IF NOT EXISTS sales_rollups_hourly (
+  id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  bucket DATETIME NOT NULL,
+  dimension VARCHAR(20) NOT NULL,
+  dim_key VARCHAR(255) NOT NULL,
+  orders INT NOT NULL,
+  quantity DECIMAL(14,2) NOT NULL,
+  amount DECIMAL(14,2) NOT NULL,
+  UNIQUE KEY uq_sales_rollups_hourly (bucket, dimension, dim_key)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ===== TABLE: sales_rollups_daily =====
+CREATE TABLE IF NOT EXISTS sales_rollups_daily (
+  id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  bucket DATETIME NOT NULL,
+  dimension VARCHAR(20) NOT NULL,
+  dim_key VARCHAR(255) NOT NULL,
+  orders INT NOT NULL,
+  quantity DECIMAL(14,2) NOT NULL,
+  amount DECIMAL(14,2) NOT NULL,
+  UNIQUE KEY uq_sales_rollups_daily (bucket, dimension, dim_key)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ===== TABLE: idempotency_keys =====
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  `key` VARCHAR(128) NOT NULL,
+  fingerprint VARCHAR(64) NOT NULL,
+  status_code INT NULL,
+  response JSON NULL,
+  created_at DATETIME NOT NULL,
+  expires_at DATETIME NOT NULL,
+  UNIQUE KEY uq_idempotency_keys_key (`key`),
+  INDEX ix_idempotency_keys_expires_at (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ===== TABLE: upload_blobs =====
+CREATE TABLE IF NOT EXISTS upload_blobs (
+  sha256 VARCHAR(64) PRIMARY KEY,
+  size BIGINT UNSIGNED NOT NULL,
+  mime_type VARCHAR(100) NOT NULL,
+  created_at DATETIME NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ===== TABLE: upload_refs =====
+CREATE TABLE IF NOT EXISTS upload_refs (
+  id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  kind VARCHAR(16) NOT NULL,
+  name VARCHAR(255) NOT NULL,
+  blob_sha256 VARCHAR(64) NOT NULL,
+  created_at DATETIME NOT NULL,
+  UNIQUE KEY uq_upload_refs_kind_name (kind, name),
+  INDEX ix_upload_refs_kind_blob (kind, blob_sha256),
+  CONSTRAINT fk_upload_refs_blob
+    FOREIGN KEY (blob_sha256) REFERENCES upload_blobs(sha256)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- ===== TABLE: announcements =====
 CREATE TABLE IF NOT EXISTS announcements (
   id BIGINT PRIMARY KEY AUTO_INCREMENT,
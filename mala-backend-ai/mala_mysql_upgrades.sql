@@ -0,0 +1,54 @@
+-- In-place upgrades for databases created from an older mala_mysql_schema.sql.
+-- New tables are picked up by re-running the schema file (CREATE TABLE IF NOT
+-- EXISTS); this file only carries changes to existing tables. Apply sections
+-- in order, once each, then run any `flask data ...` backfill they mention.
+
+-- ===== Slip/QR references as columns (backfill: flask data backfill-payment-refs) =====
+ALTER TABLE payments ADD COLUMN qr_image_url TEXT NULL;
+ALTER TABLE transfer_slips ADD COLUMN slip_url TEXT NULL;
+
+-- ===== order_items table (create via mala_mysql_schema.sql; backfill: flask data backfill-order-items) =====
+
+-- ===== Client ids for offline order sync =====
+ALTER TABLE orders
+  ADD COLUMN client_id VARCHAR(64) NULL AFTER id,
+  ADD UNIQUE KEY uq_orders_client_id (client_id);
+
+-- ===== Order archive tables (create via mala_mysql_schema.sql; move rows with: flask archive run) =====
+
+-- ===== Composite/functional indexes for hot queries (check: flask queries explain) =====
+-- Skip the created_at line if the database was created by SQLAlchemy (it already has it).
+ALTER TABLE orders ADD INDEX ix_orders_created_at (created_at);
+ALTER TABLE orders ADD INDEX ix_orders_paid_created (paid, created_at);
+ALTER TABLE payments ADD INDEX ix_payments_order_time (order_id, `time`);
+ALTER TABLE users
+  ADD COLUMN username_lower VARCHAR(255) GENERATED ALWAYS AS (LOWER(username)) STORED AFTER username,
+  ADD INDEX ix_users_username_lower (username_lower);
+
+-- ===== Product search indexes (MySQL 5.7.6+ for the ngram parser) =====
+ALTER TABLE products ADD INDEX ix_products_category_active (category, active);
+-- The index keeps the stopword setting it was built with; without this the
+-- ngram parser drops tokens containing stopwords and search misses names like "mala".
+SET SESSION innodb_ft_enable_stopword = 0;
+ALTER TABLE products ADD FULLTEXT INDEX ft_products_name (name) WITH PARSER ngram;
+
+-- ===== Content-addressed uploads (create upload_blobs/upload_refs via mala_mysql_schema.sql; older files keep serving from their directories) =====
+
+-- ===== Detection hash on orders (link existing rows: flask data link-detections) =====
+ALTER TABLE orders
+  ADD COLUMN detection_hash VARCHAR(64) NULL AFTER client_id,
+  ADD INDEX ix_orders_detection_hash (detection_hash);
+ALTER TABLE orders_archive ADD COLUMN detection_hash VARCHAR(64) NULL AFTER client_id;
+
+-- ===== Slip file name/path indexes (before running: flask data migrate-slips) =====
+ALTER TABLE transfer_slips
+  ADD INDEX ix_transfer_slips_filename (filename(191)),
+  ADD INDEX ix_transfer_slips_file_path (file_path(255));
+ALTER TABLE transfer_slips_archive
+  ADD INDEX ix_transfer_slips_archive_filename (filename(191)),
+  ADD INDEX ix_transfer_slips_archive_file_path (file_path(255));
+
+-- ===== Rebuild the product name FULLTEXT index without stopwords (if it was added with them) =====
+SET SESSION innodb_ft_enable_stopword = 0;
+ALTER TABLE products DROP INDEX ft_products_name;
+ALTER TABLE products ADD FULLTEXT INDEX ft_products_name (name) WITH PARSER ngram;